@@ -0,0 +1,795 @@
+"""
+Offline benchmark for the bot's hot paths.
+
+Generates a synthetic catalog and drives the real handlers in main.py against
+in-memory stand-ins for Firebase, TMDB, LinkPay and the Telegram Bot API, so
+no network access or credentials are needed.
+
+    python benchmark.py                       # 1k and 10k titles
+    python benchmark.py --sizes 1000,10000,100000 --iterations 50
+    python benchmark.py --ops search,show_movie --latency-ms 20
+    python benchmark.py --backend sqlite
+    python benchmark.py --ops warm_start --latency-ms 50 --bandwidth-mbps 20
+
+Reports throughput and p50/p99 latency per operation.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import types
+import zlib
+from io import BytesIO
+
+
+# ------------------ fake Firebase (firebase_admin.db) ------------------
+
+class FakeDatabase:
+    """In-memory Realtime Database tree. Reads return a JSON round-trip copy, like the wire."""
+
+    def __init__(self):
+        self.tree = {}
+        self.latency = 0.0
+        self.bytes_per_second = 0.0
+        self.calls = 0
+        self.revision = 0  # bumped on every write; stands in for the ETag of any node
+
+    def _hop(self):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _transfer(self, value):
+        """Round-trip a read through JSON, sleeping for its size when a bandwidth is set."""
+        if value is None:
+            return None
+        encoded = json.dumps(value)
+        if self.bytes_per_second:
+            time.sleep(len(encoded) / self.bytes_per_second)
+        return json.loads(encoded)
+
+    def node(self, parts, create=False):
+        cur = self.tree
+        for p in parts:
+            if not isinstance(cur, dict):
+                return None
+            if p not in cur:
+                if not create:
+                    return None
+                cur[p] = {}
+            cur = cur[p]
+        return cur
+
+    def write(self, parts, value):
+        self.revision += 1
+        if isinstance(value, dict) and ".sv" in value:  # ServerValue.increment
+            current = self.node(parts)
+            value = (current if isinstance(current, int) else 0) + value[".sv"]["increment"]
+        if not parts:
+            self.tree = value if isinstance(value, dict) else {}
+            return
+        parent = self.node(parts[:-1], create=True)
+        if value is None or value == {}:
+            parent.pop(parts[-1], None)
+        else:
+            parent[parts[-1]] = json.loads(json.dumps(value))
+        self._prune(parts[:-1])
+
+    def _prune(self, parts):
+        # Firebase drops empty parents after a delete
+        while parts:
+            node = self.node(parts)
+            if node:
+                return
+            self.node(parts[:-1]).pop(parts[-1], None)
+            parts = parts[:-1]
+
+
+FAKE_DB = FakeDatabase()
+
+
+def _split(path):
+    return [p for p in path.strip("/").split("/") if p]
+
+
+class FakeReference:
+    def __init__(self, path=""):
+        self.parts = _split(path)
+        self.path = "/" + "/".join(self.parts)
+        self.key = self.parts[-1] if self.parts else None
+
+    def child(self, path):
+        return FakeReference("/".join(self.parts + _split(path)))
+
+    def get(self, etag=False, shallow=False):
+        FAKE_DB._hop()
+        value = FAKE_DB.node(self.parts)
+        if shallow and isinstance(value, dict):
+            value = {k: True for k in value}
+        value = FAKE_DB._transfer(value)
+        return (value, str(FAKE_DB.revision)) if etag else value
+
+    def get_if_changed(self, etag):
+        FAKE_DB._hop()
+        if etag == str(FAKE_DB.revision):
+            return False, None, etag
+        return True, FAKE_DB._transfer(FAKE_DB.node(self.parts)), str(FAKE_DB.revision)
+
+    def set(self, value):
+        FAKE_DB._hop()
+        FAKE_DB.write(self.parts, value)
+
+    def update(self, value):
+        FAKE_DB._hop()
+        for path, v in value.items():
+            FAKE_DB.write(self.parts + _split(path), v)
+
+    def delete(self):
+        FAKE_DB._hop()
+        FAKE_DB.write(self.parts, None)
+
+    def transaction(self, update):
+        FAKE_DB._hop()
+        value = update(FAKE_DB._transfer(FAKE_DB.node(self.parts)))
+        FAKE_DB._hop()
+        FAKE_DB.write(self.parts, value)
+        return value
+
+    def order_by_child(self, path):
+        return FakeQuery(self, ("child", _split(path)))
+
+    def order_by_key(self):
+        return FakeQuery(self, ("key", None))
+
+    def order_by_value(self):
+        return FakeQuery(self, ("value", None))
+
+
+class FakeQuery:
+    """order_by_* / start_at / end_at / limit_to_* evaluated over the fake tree."""
+
+    def __init__(self, ref, order):
+        self.ref = ref
+        self.order = order
+        self.start = self.end = None
+        self.first = self.last = None
+
+    def start_at(self, value):
+        self.start = value
+        return self
+
+    def end_at(self, value):
+        self.end = value
+        return self
+
+    def equal_to(self, value):
+        self.start = self.end = value
+        return self
+
+    def limit_to_first(self, n):
+        self.first = n
+        return self
+
+    def limit_to_last(self, n):
+        self.last = n
+        return self
+
+    def _sort_value(self, key, value):
+        kind, path = self.order
+        if kind == "key":
+            return key
+        if kind == "value":
+            return value
+        for part in path:
+            value = value.get(part) if isinstance(value, dict) else None
+        return value
+
+    def get(self):
+        FAKE_DB._hop()
+        node = FAKE_DB.node(self.ref.parts) or {}
+        rows = []
+        for key, value in node.items():
+            sort = self._sort_value(key, value)
+            if (self.start is not None or self.end is not None) and sort is None:
+                continue
+            if self.start is not None and sort < self.start:
+                continue
+            if self.end is not None and sort > self.end:
+                continue
+            rows.append((sort, key, value))
+        rows.sort(key=lambda r: (r[0] is not None, r[0], r[1]))
+        if self.first is not None:
+            rows = rows[:self.first]
+        if self.last is not None:
+            rows = rows[-self.last:]
+        return FAKE_DB._transfer({key: value for _, key, value in rows}) or {}
+
+
+def install_fake_firebase():
+    firebase_admin = types.ModuleType("firebase_admin")
+    firebase_admin._apps = {}
+    firebase_admin.initialize_app = lambda *a, **kw: firebase_admin._apps.setdefault("[DEFAULT]", object())
+
+    credentials = types.ModuleType("firebase_admin.credentials")
+    credentials.Certificate = lambda key: key
+
+    db = types.ModuleType("firebase_admin.db")
+    db.reference = lambda path="": FakeReference(path)
+    db.Reference = FakeReference
+
+    firebase_admin.credentials = credentials
+    firebase_admin.db = db
+    sys.modules["firebase_admin"] = firebase_admin
+    sys.modules["firebase_admin.credentials"] = credentials
+    sys.modules["firebase_admin.db"] = db
+
+
+# ------------------ fake HTTP (TMDB, LinkPay, poster images) ------------------
+
+def _tiny_png():
+    from PIL import Image
+    buf = BytesIO()
+    Image.new("RGB", (20, 30), (40, 80, 120)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+class FakeResponse:
+    def __init__(self, payload=None, content=b"", status_code=200):
+        self._payload = payload
+        self.content = content
+        self.status_code = status_code
+        self.text = json.dumps(payload) if payload is not None else ""
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+    def json(self):
+        return self._payload
+
+
+class FakeHttp:
+    """Routes requests.get and httpx calls to canned TMDB / LinkPay / image responses."""
+
+    def __init__(self):
+        self.png = _tiny_png()
+        self.calls = 0
+        self.counter = 0
+        self.link_latency = 0.0
+
+    def get(self, url, params=None, headers=None, timeout=None, **kwargs):
+        self.calls += 1
+        params = params or {}
+        if "linkpays" in url:
+            self.counter += 1
+            return FakeResponse({"status": "success", "shortenedUrl": f"https://linkpays.in/s{self.counter}"})
+        if "/search/multi" in url:
+            query = params.get("query", "")
+            year = params.get("year") or "2015"
+            tmdb_id = abs(hash(query)) % 10**6
+            return FakeResponse({"results": [
+                {"id": tmdb_id, "media_type": "movie", "title": query,
+                 "release_date": f"{year}-01-01", "poster_path": "/poster.jpg"},
+                {"id": tmdb_id + 1, "media_type": "tv", "name": query,
+                 "first_air_date": f"{year}-01-01", "poster_path": "/tv.jpg"},
+            ]})
+        if "/season/" in url:
+            return FakeResponse({"poster_path": "/season.jpg"})
+        if "/tv/" in url:
+            appended = (params.get("append_to_response") or "").split(",")
+            return FakeResponse({k: {"poster_path": f"/{k}.jpg"} for k in appended if k})
+        return FakeResponse(content=self.png)
+
+    async def handle(self, request):
+        """httpx.MockTransport handler."""
+        import httpx
+        if request.url.host.endswith("links.bench"):
+            # quality links: 1 in 10 dead, 1 in 7 hosts refuse HEAD
+            n = zlib.crc32(request.url.path.encode())
+            if self.link_latency:
+                await asyncio.sleep(self.link_latency)
+            if request.method == "HEAD" and n % 7 == 0:
+                return httpx.Response(405)
+            return httpx.Response(404 if n % 10 == 0 else 200)
+        resp = self.get(str(request.url.copy_with(query=None)), params=dict(request.url.params))
+        if resp._payload is not None:
+            return httpx.Response(resp.status_code, json=resp._payload)
+        return httpx.Response(resp.status_code, content=resp.content)
+
+
+FAKE_HTTP = FakeHttp()
+
+
+# ------------------ fake Telegram Bot API ------------------
+
+class FakeUser:
+    def __init__(self, user_id):
+        self.id = user_id
+        self.username = f"user{user_id}"
+        self.first_name = "Bench"
+        self.last_name = None
+
+
+class FakeChat:
+    def __init__(self, chat_id):
+        self.id = chat_id
+
+
+class FakeFile:
+    def __init__(self, data):
+        self.data = data
+
+    async def download_as_bytearray(self):
+        return bytearray(self.data)
+
+
+class FakeDocument:
+    def __init__(self, file_name, data):
+        self.file_name = file_name
+        self.file_id = f"file-{file_name}"
+        self._data = data
+
+    async def get_file(self):
+        return FakeFile(self._data)
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = 0
+        self.next_id = 1000
+
+    def _message(self, chat_id, text=None):
+        self.sent += 1
+        self.next_id += 1
+        return FakeMessage(self, FakeUser(chat_id), text=text, message_id=self.next_id)
+
+    async def send_message(self, chat_id, text, **kwargs):
+        return self._message(chat_id, text)
+
+    async def send_document(self, chat_id, document, **kwargs):
+        return self._message(chat_id)
+
+    async def send_photo(self, chat_id, photo, **kwargs):
+        return self._message(chat_id)
+
+    async def edit_message_text(self, text, chat_id=None, message_id=None, **kwargs):
+        self.sent += 1
+        return True
+
+    async def delete_message(self, chat_id, message_id, **kwargs):
+        return True
+
+    async def delete_messages(self, chat_id, message_ids, **kwargs):
+        return True
+
+    async def answer_inline_query(self, inline_query_id, results, **kwargs):
+        self.sent += 1
+        return True
+
+
+class FakeMessage:
+    def __init__(self, bot, user, text=None, document=None, message_id=1):
+        self.bot = bot
+        self.from_user = user
+        self.chat = FakeChat(user.id)
+        self.chat_id = user.id
+        self.text = text
+        self.caption = None
+        self.document = document
+        self.message_id = message_id
+
+    async def reply_text(self, text, **kwargs):
+        return self.bot._message(self.chat.id, text)
+
+    async def reply_photo(self, photo, **kwargs):
+        return self.bot._message(self.chat.id)
+
+    async def reply_document(self, document, **kwargs):
+        return self.bot._message(self.chat.id)
+
+    async def reply_video(self, video, **kwargs):
+        return self.bot._message(self.chat.id)
+
+    async def edit_text(self, text, **kwargs):
+        self.bot.sent += 1
+        return self
+
+    async def delete(self):
+        return True
+
+
+class FakeCallbackQuery:
+    def __init__(self, bot, user, data):
+        self.id = "cb"
+        self.data = data
+        self.from_user = user
+        self.message = FakeMessage(bot, user)
+
+    async def answer(self, *args, **kwargs):
+        return True
+
+    async def edit_message_text(self, text, **kwargs):
+        return self.message
+
+
+class FakeInlineQuery:
+    def __init__(self, bot, user, query):
+        self.id = "iq"
+        self.bot = bot
+        self.from_user = user
+        self.query = query
+
+    async def answer(self, results, **kwargs):
+        return await self.bot.answer_inline_query(self.id, results, **kwargs)
+
+
+class FakeUpdate:
+    def __init__(self, user, message=None, callback_query=None, inline_query=None):
+        self.effective_user = user
+        self.effective_chat = FakeChat(user.id)
+        self.message = message
+        self.callback_query = callback_query
+        self.inline_query = inline_query
+
+    @property
+    def effective_message(self):
+        if self.message is not None:
+            return self.message
+        return self.callback_query.message if self.callback_query else None
+
+
+class FakeContext:
+    def __init__(self, bot, args=None):
+        self.bot = bot
+        self.args = args or []
+        self.user_data = {}
+        self.bot_data = {}
+
+
+# ------------------ synthetic catalog ------------------
+
+WORDS = (
+    "shadow night city dark river king queen lost empire last fire storm ghost "
+    "iron blood silent golden broken secret wild star moon sun dragon hunter "
+    "legend return rise fall war heart code zero eternal black white red winter "
+    "summer mission escape dream edge game house island journey light"
+).split()
+DIRTY = ["HD", "Full Movie", "Download", "WEB-DL", "Bluray"]
+QUALITIES = ["480p", "720p", "1080p", "2160p"]
+
+
+def make_title(rng, i):
+    words = " ".join(rng.choice(WORDS).capitalize() for _ in range(rng.randint(1, 4)))
+    title = f"{words} {i}"
+    if rng.random() < 0.15:
+        title += f" S{rng.randint(1, 9):02d}"
+    if rng.random() < 0.05:
+        title += f" {rng.choice(DIRTY)}"
+    return f"{title} ({rng.randint(1960, 2025)})"
+
+
+def make_catalog(size, seed=42):
+    rng = random.Random(seed)
+    now = int(time.time())
+    catalog = {}
+    for i in range(size):
+        title = make_title(rng, i)
+        entry = {q: f"https://h{i % 200}.links.bench/{i}{q}" for q in rng.sample(QUALITIES, rng.randint(1, 3))}
+        meta = {"date_added": now - rng.randint(0, 86400 * 365)}
+        if rng.random() < 0.7:
+            meta.update({
+                "poster": f"https://image.tmdb.org/t/p/w500/{i}.jpg",
+                "tmdb_id": 1000 + i,
+                "tmdb_title": title,
+                "year": title[-5:-1],
+                "is_series": " S0" in title,
+            })
+        entry["meta"] = meta
+        catalog[title] = entry
+    return catalog
+
+
+def make_typo(rng, title):
+    words = title.lower().split()[:2]
+    text = " ".join(words)
+    if len(text) > 3:
+        i = rng.randrange(len(text) - 1)
+        text = text[:i] + text[i + 1] + text[i] + text[i + 2:]
+    return text + "x"
+
+
+# ------------------ runner ------------------
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    idx = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[idx]
+
+
+async def measure(name, size, iterations, setup, run):
+    samples = []
+    for i in range(iterations):
+        args = setup(i)
+        started = time.perf_counter()
+        await run(*args)
+        samples.append(time.perf_counter() - started)
+    total = sum(samples)
+    return {
+        "op": name,
+        "size": size,
+        "n": iterations,
+        "ops_s": iterations / total if total else float("inf"),
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+        "mean_ms": statistics.mean(samples) * 1000,
+    }
+
+
+def load_catalog(main, catalog):
+    FAKE_DB.tree = {"movies": json.loads(json.dumps(catalog)), "Users": {}}
+    FAKE_DB.revision += 1
+    if main.STORAGE_BACKEND != "firebase":
+        main.storage.import_movies(catalog)
+    main.catalog.invalidate()
+
+
+async def bench_size(main, size, iterations, ops, upload_lines):
+    rng = random.Random(size)
+    catalog = make_catalog(size)
+    titles = list(catalog)
+    load_catalog(main, catalog)
+    bot = FakeBot()
+    user = FakeUser(12345)
+    admin = FakeUser(main.ADMIN_ID)
+    results = []
+
+    def text_update(u, text, document=None):
+        return FakeUpdate(u, message=FakeMessage(bot, u, text=text, document=document))
+
+    def callback_update(u, data):
+        return FakeUpdate(u, callback_query=FakeCallbackQuery(bot, u, data))
+
+    async def call(handler, update, args=None):
+        await handler(update, FakeContext(bot, args))
+
+    if "search" in ops:
+        def setup(i):
+            word = rng.choice(titles).split()[0].lower()
+            return (text_update(user, word),)
+        results.append(await measure("search_movie[substring]", size, iterations, setup,
+                                     lambda upd: call(main.search_movie, upd)))
+
+    if "search_page" in ops:
+        await call(main.search_movie, text_update(user, "the"))
+        search_id = main.search_results_id("the", main.catalog.version)
+
+        def setup(i):
+            return (callback_update(user, f"sp|{search_id}|{i % 5}"),)
+        results.append(await measure("show_search_page", size, iterations, setup,
+                                     lambda upd: call(main.button_handler, upd)))
+
+    if "fuzzy" in ops:
+        def setup(i):
+            return (text_update(user, make_typo(rng, rng.choice(titles))),)
+        results.append(await measure("search_movie[fuzzy]", size, max(1, iterations // 5), setup,
+                                     lambda upd: call(main.search_movie, upd)))
+
+    if "inline" in ops:
+        def setup(i):
+            words = rng.choice(titles).lower().split()
+            word = rng.choice(words)
+            # a keystroke-sized prefix of a random word; every 4th query a two-word prefix
+            query = word[:rng.randint(2, max(2, len(word)))]
+            if i % 4 == 0 and len(words) > 1:
+                query = f"{words[0]} {words[1][:2]}"
+            return (FakeUpdate(user, inline_query=FakeInlineQuery(bot, user, query)),)
+        main.inline_cache.entries.clear()
+        results.append(await measure("inline_search", size, iterations, setup,
+                                     lambda upd: call(main.inline_search, upd)))
+
+    if "show_movie" in ops:
+        def setup(i):
+            title = rng.choice(titles)
+            safe = main.re.sub(r"[^a-zA-Z0-9_\-]", "", main.clean_firebase_key(title))[:50]
+            return (callback_update(user, f"movie|{safe}"),)
+        results.append(await measure("show_movie", size, iterations, setup,
+                                     lambda upd: call(main.show_movie, upd)))
+
+    if "show_movie_page" in ops:
+        modes = list(main.BROWSE_VIEWS)
+
+        def setup(i):
+            mode = modes[i % len(modes)]
+            entries = main.BROWSE_VIEWS[mode].sync()
+            entry = rng.choice(entries) if entries else None
+            return (callback_update(user, main.browse_callback(mode, "b" if i % 2 else "f", entry)),)
+        results.append(await measure("show_movie_page", size, iterations, setup,
+                                     lambda upd: call(main.button_handler, upd)))
+
+    if "enrich" in ops:
+        def setup(i):
+            return (rng.choice(titles),)
+        results.append(await measure("ensure_poster_for_movie", size, iterations, setup,
+                                     lambda key: main.ensure_poster_for_movie(key, force=True)))
+
+        series = "Benchmark Show S01 (2015)"
+        main.storage.set_movie(series, {f"S{n:02d}": {"720p": f"https://x/{n}"} for n in range(1, 11)})
+        results.append(await measure("ensure_poster_for_movie[10 seasons]", size, iterations,
+                                     lambda i: (series,),
+                                     lambda key: main.ensure_poster_for_movie(key, force=True)))
+        load_catalog(main, catalog)
+
+    if "checklinks" in ops:
+        links = sum(1 for movie in catalog.values() for _ in main.movie_links(movie))
+
+        def setup(i):
+            load_catalog(main, catalog)
+            return ()
+        results.append(await measure(f"run_link_check[{links} links]", size, 1, setup,
+                                     lambda: main.run_link_check(fresh=True)))
+        results.append(await measure("run_link_check[all cached]", size, 1, lambda i: (),
+                                     lambda: main.run_link_check(fresh=True)))
+        load_catalog(main, catalog)
+
+    if "warm_start" in ops:
+        load_catalog(main, catalog)
+        path = os.path.join(os.environ.get("TMPDIR", "/tmp"), "bench_catalog.snapshot.jsonl.gz")
+        main.catalog.get()
+        main.catalog.snapshot_path = path
+        main.catalog.snapshot_version = None
+        await main.catalog.save_snapshot()
+        for key in titles[:50]:
+            main.storage.update_meta(key, {"year": "2001"})
+        for key in titles[50:60]:
+            main.storage.delete_movie(key)
+
+        def cold_load(snapshot_path):
+            cache = main.CatalogCache(main.storage, main.CATALOG_TTL, snapshot_path)
+            try:
+                return cache.get()
+            finally:
+                main.storage.listeners.remove(cache.apply)
+
+        async def run(snapshot_path):
+            assert len(cold_load(snapshot_path)) == size - 10
+        results.append(await measure("catalog first load[full]", size, max(1, iterations // 5),
+                                     lambda i: ("",), run))
+        results.append(await measure("catalog first load[snapshot+delta]", size, max(1, iterations // 5),
+                                     lambda i: (path,), run))
+        os.remove(path)
+        main.catalog.snapshot_path = ""
+        load_catalog(main, catalog)
+
+    if "refresh" in ops:
+        load_catalog(main, catalog)
+        main.catalog.get()
+
+        async def refresh(etag_known, etag_due=True):
+            if not etag_known:
+                main.catalog.etag = None
+            if etag_due:
+                main.catalog.etag_checked_at = 0
+            main.catalog.loaded_at = 0  # TTL expired
+            main.catalog.get()
+        results.append(await measure("catalog TTL refresh[full read]", size, max(1, iterations // 5),
+                                     lambda i: (False,), refresh))
+        results.append(await measure("catalog TTL refresh[not modified]", size, iterations,
+                                     lambda i: (True,), refresh))
+        results.append(await measure("catalog TTL refresh[version unchanged]", size, iterations,
+                                     lambda i: (True, False), refresh))
+        results.append(await measure("catalog version check[unchanged]", size, iterations,
+                                     lambda i: (), main.catalog.sync_remote))
+        load_catalog(main, catalog)
+
+    if "clean_titles" in ops:
+        def setup(i):
+            load_catalog(main, catalog)
+            return (text_update(admin, "/cleantitles"),)
+        results.append(await measure("clean_titles", size, max(1, iterations // 10), setup,
+                                     lambda upd: call(main.clean_titles, upd)))
+        load_catalog(main, catalog)
+
+    if "upload_bulk" in ops:
+        def setup(i):
+            load_catalog(main, catalog)
+            lines = []
+            for n in range(upload_lines):
+                title = rng.choice(titles) if n % 2 else make_title(rng, size + n)
+                lines.append(f"{title} {rng.choice(QUALITIES)} https://example.com/{n}")
+            doc = FakeDocument("bulk.txt", "\n".join(lines).encode())
+            return (text_update(admin, None, document=doc),)
+
+        async def run(upd):
+            await call(main.upload_bulk, upd)
+            await main.upload_task  # the handler only queues the job
+        results.append(await measure(f"upload_bulk[{upload_lines} lines]", size, 1, setup, run))
+        load_catalog(main, catalog)
+
+    if "pdf" in ops:
+        def setup(i):
+            start = rng.randrange(0, max(1, size - 20))
+            return (list(catalog.items())[start:start + 20],)
+
+        async def run(movie_slice):
+            path = os.path.join(os.environ.get("TMPDIR", "/tmp"), "bench_movies.pdf")
+            main.create_movies_pdf_range(movie_slice, path)
+            os.remove(path)
+        results.append(await measure("create_movies_pdf_range[20]", size, max(1, iterations // 10), setup, run))
+
+    return results
+
+
+ALL_OPS = ["search", "search_page", "fuzzy", "inline", "show_movie", "show_movie_page", "enrich", "checklinks", "warm_start", "refresh", "clean_titles", "upload_bulk", "pdf"]
+
+
+def import_main(backend):
+    os.environ["STORAGE_BACKEND"] = backend
+    os.environ.setdefault("SQLITE_PATH", ":memory:")
+    os.environ.setdefault("SNAPSHOT_PATH", "")
+    os.environ.setdefault("STATE_PATH", ":memory:")
+    os.environ.setdefault("BOT_TOKEN", "123456:BENCHMARK")
+    os.environ.setdefault("FIREBASE_URL", "https://bench.invalid")
+    os.environ.setdefault("FIREBASE_KEY", "{}")
+    os.environ.setdefault("LINKPAY_API", "bench")
+    os.environ.setdefault("ADMIN_ID", "1")
+    os.environ.setdefault("TMDB_TOKEN", "bench")
+    install_fake_firebase()
+
+    import logging
+    import requests
+    http = FAKE_HTTP
+    requests.get = http.get
+
+    import httpx
+    import main
+    main.http_client = httpx.AsyncClient(transport=httpx.MockTransport(http.handle))
+    logging.getLogger().setLevel(logging.WARNING)
+    return main
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Offline benchmark for movies-bot hot paths")
+    parser.add_argument("--sizes", default="1000,10000", help="comma-separated catalog sizes")
+    parser.add_argument("--iterations", type=int, default=30, help="iterations per operation")
+    parser.add_argument("--ops", default=",".join(ALL_OPS), help="subset of: " + ",".join(ALL_OPS))
+    parser.add_argument("--upload-lines", type=int, default=200, help="lines in the synthetic bulk upload")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="simulated Firebase round trip")
+    parser.add_argument("--bandwidth-mbps", type=float, default=0.0,
+                        help="simulated Firebase download speed (0 = unlimited)")
+    parser.add_argument("--link-latency-ms", type=float, default=20.0,
+                        help="simulated round trip per link in the checklinks op")
+    parser.add_argument("--backend", default="firebase", choices=["firebase", "sqlite"],
+                        help="storage backend (firebase uses the in-memory fake)")
+    parser.add_argument("--json", action="store_true", help="print results as JSON lines")
+    args = parser.parse_args()
+
+    main = import_main(args.backend)
+    FAKE_DB.latency = args.latency_ms / 1000
+    FAKE_DB.bytes_per_second = args.bandwidth_mbps * 125_000
+    FAKE_HTTP.link_latency = args.link_latency_ms / 1000
+    ops = set(args.ops.split(","))
+
+    async def run_all():
+        rows = []
+        for size in [int(s) for s in args.sizes.split(",")]:
+            rows.extend(await bench_size(main, size, args.iterations, ops, args.upload_lines))
+        return rows
+
+    rows = asyncio.run(run_all())
+
+    if args.json:
+        for row in rows:
+            print(json.dumps(row))
+        return
+
+    print(f"{'operation':<40}{'size':>8}{'n':>5}{'ops/s':>11}{'p50 ms':>11}{'p99 ms':>11}")
+    for r in rows:
+        print(f"{r['op']:<40}{r['size']:>8}{r['n']:>5}{r['ops_s']:>11.1f}{r['p50_ms']:>11.2f}{r['p99_ms']:>11.2f}")
+
+
+if __name__ == "__main__":
+    main_cli()
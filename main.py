@@ -10,6 +10,25 @@ import logging
 import firebase_admin
 import urllib3
 import sys
+import cProfile
+import pstats
+import functools
+import sqlite3
+import heapq
+import itertools
+import copy
+import contextlib
+import queue
+import bisect
+import zlib
+import hashlib
+import gzip
+from urllib.parse import urlsplit
+from collections import OrderedDict, deque
+from collections import Counter, defaultdict
+from collections.abc import MutableMapping
+import socket
+import threading
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfgen import canvas
@@ -19,62 +38,1674 @@ from reportlab.lib.styles import getSampleStyleSheet
 import requests
 import tempfile
 from PIL import Image
-from io import BytesIO
+from io import BytesIO, StringIO
 from telegram.helpers import escape_markdown
 from datetime import datetime
 from firebase_admin import credentials, db
 from fastapi import FastAPI, Request
 import uvicorn
-from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
+from telegram import (
+    Update,
+    InlineKeyboardMarkup,
+    InlineKeyboardButton,
+    InlineQueryResultArticle,
+    InlineQueryResultPhoto,
+    InputTextMessageContent,
+)
+from telegram.error import RetryAfter
 from telegram.ext import (
     Application,
     CommandHandler,
     ContextTypes,
     MessageHandler,
     CallbackQueryHandler,
+    InlineQueryHandler,
     filters,
 )
 
 
 import sys
+import logging.handlers
+import atexit
+
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()  # json | text
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_SAMPLE_FIRST = int(os.getenv("LOG_SAMPLE_FIRST", "5"))  # per-item events logged in full before sampling
+LOG_SAMPLE_EVERY = int(os.getenv("LOG_SAMPLE_EVERY", "100"))  # after that, one in N
+LOG_SAMPLE_PER_SECOND = float(os.getenv("LOG_SAMPLE_PER_SECOND", "5"))  # hard cap per event name
+
+
+def _secret_values() -> list:
+    """Env secrets that must never reach the log stream verbatim."""
+    values = [os.getenv("BOT_TOKEN"), os.getenv("LINKPAY_API"), os.getenv("TMDB_TOKEN")]
+    try:
+        key = json.loads(os.getenv("FIREBASE_KEY") or "{}")
+        values += [key.get("private_key"), key.get("private_key_id")]
+    except ValueError:
+        pass
+    return sorted({v for v in values if v and len(v) >= 8}, key=len, reverse=True)
+
+
+_SECRET_PATTERNS = [
+    re.compile(r"(?i)(api(?:_?key)?['\"]?\s*[:=]\s*['\"]?)[^'\"&\s,}]+"),
+    re.compile(r"bot\d+:[\w-]+"),
+    re.compile(r"(?i)(bearer\s+)\S+"),
+]
+_secret_values_re = None
+
+
+def redact(text: str) -> str:
+    """Mask API keys and tokens in a log line."""
+    global _secret_values_re
+    if _secret_values_re is None:
+        secrets = _secret_values()
+        _secret_values_re = re.compile("|".join(map(re.escape, secrets))) if secrets else False
+    if _secret_values_re:
+        text = _secret_values_re.sub("***", text)
+    for pattern in _SECRET_PATTERNS:
+        text = pattern.sub(lambda m: (m.group(1) if m.groups() else "bot") + "***", text)
+    return text
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; `extra={"event": ..., "fields": {...}}` becomes top-level keys."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        out = {
+            "ts": datetime.utcfromtimestamp(record.created).isoformat(timespec="milliseconds") + "Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        event = getattr(record, "event", None)
+        if event:
+            out["event"] = event
+        fields = getattr(record, "fields", None)
+        if fields:
+            out.update(fields)
+        if record.exc_text:
+            out["exc"] = record.exc_text
+        return json.dumps(out, ensure_ascii=False, default=str)
+
+
+class RedactingQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the listener thread with the message rendered and secrets masked.
+
+    Formatting and the stdout write happen on the listener thread, so a log call on the
+    event loop is just a dict copy and a queue put.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = redact(record.getMessage())
+        record.args = None
+        if record.exc_info:
+            record.exc_text = redact(logging.Formatter().formatException(record.exc_info))
+        record.exc_info = None
+        return record
+
+
+class EventSampler:
+    """Decides which occurrences of a high-volume event get logged.
+
+    The first `first` occurrences of each event are logged, then one in `every`, and never
+    more than `per_second` per event. Counts of everything seen are kept for the summary
+    event at the end of a job.
+    """
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s | %(levelname)s | %(message)s",
-    handlers=[logging.StreamHandler(sys.stdout)]
+    def __init__(self, first: int = LOG_SAMPLE_FIRST, every: int = LOG_SAMPLE_EVERY,
+                 per_second: float = LOG_SAMPLE_PER_SECOND):
+        self.first = first
+        self.every = max(1, every)
+        self.per_second = per_second
+        self.seen = Counter()
+        self.logged = Counter()
+        self._window = {}
+
+    def allow(self, event: str) -> bool:
+        self.seen[event] += 1
+        n = self.seen[event]
+        if n > self.first and n % self.every:
+            return False
+        now = int(time.monotonic())
+        second, count = self._window.get(event, (now, 0))
+        if second != now:
+            second, count = now, 0
+        if count >= self.per_second:
+            return False
+        self._window[event] = (second, count + 1)
+        self.logged[event] += 1
+        return True
+
+    def log(self, level: int, event: str, msg: str, **fields):
+        if self.allow(event) and logger.isEnabledFor(level):
+            logger.log(level, msg, extra={"event": event, "fields": fields})
+
+    def counts(self) -> dict:
+        return {event: {"seen": n, "logged": self.logged[event]} for event, n in self.seen.items()}
+
+    def stats(self) -> str:
+        return (f"{LOG_FORMAT}, logged {sum(self.logged.values())} of {sum(self.seen.values())} "
+                f"sampled events, queue {_log_queue.qsize()}")
+
+
+_log_queue = queue.SimpleQueue()
+_log_stream = logging.StreamHandler(sys.stdout)
+_log_stream.setFormatter(
+    JsonFormatter() if LOG_FORMAT == "json"
+    else logging.Formatter("%(asctime)s | %(levelname)s | %(message)s")
 )
+log_listener = logging.handlers.QueueListener(_log_queue, _log_stream, respect_handler_level=False)
+logging.basicConfig(level=LOG_LEVEL, handlers=[RedactingQueueHandler(_log_queue)], force=True)
+logging.getLogger("httpx").setLevel(logging.WARNING)  # one INFO line per Telegram/TMDB request, token in the URL
+log_listener.start()
+
+
+def stop_logging():
+    """Flush queued records to stdout; safe to call more than once."""
+    if log_listener._thread is not None:
+        log_listener.stop()
+
+
+atexit.register(stop_logging)
 
 logger = logging.getLogger(__name__)
+hot_log = EventSampler()  # long-lived sampler for per-request events outside jobs
 TOKEN = os.getenv("BOT_TOKEN")
 FIREBASE_URL = os.getenv("FIREBASE_URL")
-FIREBASE_KEY = json.loads(os.getenv("FIREBASE_KEY"))
+FIREBASE_KEY = json.loads(os.getenv("FIREBASE_KEY") or "{}")
 LINKPAY_API = os.getenv("LINKPAY_API")
 ADMIN_ID = int(os.getenv("ADMIN_ID"))
 TMDB_TOKEN = os.getenv("TMDB_TOKEN", "")  # put your TMDB v4 token in Railway env
 TMDB_BASE_URL = "https://api.themoviedb.org/3"
 TMDB_IMAGE_BASE = "https://image.tmdb.org/t/p/w500"
-
-
-if not firebase_admin._apps:
+TMDB_APPEND_LIMIT = 20  # max sub-requests TMDB accepts in append_to_response
+ENRICH_RETRY_HOURS = int(os.getenv("ENRICH_RETRY_HOURS", "24"))  # back-off after a failed TMDB lookup
+ENRICH_REFRESH_DAYS = int(os.getenv("ENRICH_REFRESH_DAYS", "30"))  # re-check complete TMDB metadata this old
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "firebase").lower()  # firebase | sqlite
+SQLITE_PATH = os.getenv("SQLITE_PATH", "movies.db")
+CATALOG_TTL = int(os.getenv("CATALOG_TTL", "300"))  # seconds before re-reading the whole catalog
+CATALOG_ETAG_TTL = int(os.getenv("CATALOG_ETAG_TTL", "3600"))  # ETag re-check for edits that skip catalog_version
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "512"))
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH", "catalog.snapshot.jsonl.gz")  # empty disables snapshots
+SNAPSHOT_INTERVAL = int(os.getenv("SNAPSHOT_INTERVAL", "600"))  # seconds between snapshot writes
+SNAPSHOT_MAX_AGE = int(os.getenv("SNAPSHOT_MAX_AGE_DAYS", "7")) * 86400  # older snapshots are ignored
+SNAPSHOT_SKEW = 60  # delta sync starts this many seconds before the snapshot, for clock drift
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "10"))  # tokens a user can spend at once
+RATE_LIMIT_REFILL = float(os.getenv("RATE_LIMIT_REFILL", "1"))  # tokens per second per user
+RATE_LIMIT_GLOBAL = float(os.getenv("RATE_LIMIT_GLOBAL", "60"))  # tokens per second for everyone together
+RATE_LIMIT_MAX_USERS = int(os.getenv("RATE_LIMIT_MAX_USERS", "10000"))  # buckets kept in memory
+SEND_GLOBAL_PER_SECOND = float(os.getenv("SEND_GLOBAL_PER_SECOND", "25"))  # Telegram allows ~30 msg/s
+SEND_CHAT_PER_SECOND = 1.0  # sustained per-chat rate Telegram tolerates
+SEND_CHAT_BURST = 3
+TEMP_MESSAGE_SECONDS = 10  # lifetime of send_temp_log messages
+DELETE_BATCH_WINDOW = 0.5  # deletions due within this window go out together
+DELETE_FLUSH_SECONDS = 5  # how often pending deletions are persisted
+STATE_PATH = os.getenv("STATE_PATH", "state.db")  # SQLite file shared by the workers on this host
+WORKERS = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))  # uvicorn workers; global send/rate budgets are split
+LEASE_TTL = 30  # seconds a job lock or leadership survives without renewal
+CATALOG_SYNC_SECONDS = float(os.getenv("CATALOG_SYNC_SECONDS", "1"))  # how often to look for other workers' writes
+CATALOG_VERSION_SECONDS = float(os.getenv("CATALOG_VERSION_SECONDS", "15"))  # how often to poll catalog_version for other instances
+CONVERSATION_TTL = 86400  # idle conversation state (pending prompts, paging) expires after a day
+
+
+if STORAGE_BACKEND == "firebase" and not firebase_admin._apps:
     cred = credentials.Certificate(FIREBASE_KEY)
     firebase_admin.initialize_app(cred, {"databaseURL": FIREBASE_URL})
 
-ref = db.reference("movies")
+
+# ------------------ storage backends ------------------
+
+def normalize_title(title: str) -> str:
+    """Lowercased, single-spaced title used for matching and indexing."""
+    return " ".join(title.replace("_", " ").lower().split())
+
+
+def split_path(path: str) -> list[str]:
+    return [p for p in path.split("/") if p]
+
+
+def apply_updates(tree: dict, updates: dict) -> dict:
+    """Apply Firebase-style multi-path updates ({"a/b": value}, None deletes) to a dict in place."""
+    for path, value in updates.items():
+        parts = split_path(path)
+        node = tree
+        for part in parts[:-1]:
+            child = node.get(part)
+            if not isinstance(child, dict):
+                child = node[part] = {}
+            node = child
+        if value is None or value == {}:
+            node.pop(parts[-1], None)
+        else:
+            node[parts[-1]] = value
+    return tree
+
+
+class MovieStore:
+    """
+    Storage interface for movies, users, requests and reports.
+    Every catalog write bumps `version` and passes the multi-path update to
+    `listeners` (None means the whole catalog was replaced).
+    Users / Requests / Reports are plain keyed collections.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self.listeners = []
+
+    def _changed(self, updates=None):
+        self.version += 1
+        for listener in self.listeners:
+            listener(updates)
+
+    def _stamped(self, updates: dict) -> dict:
+        """
+        Copy of a multi-path update that also sets meta/updated_at on every title it
+        writes, and records a Deleted/<key> tombstone for every title it removes.
+        Delta sync (movies_changed_since / deleted_since) relies on both.
+        """
+        now = int(time.time())
+        stamped = dict(updates)
+        whole, meta_whole, partial, deleted = set(), set(), set(), []
+        for path, value in updates.items():
+            parts = split_path(path)
+            key = parts[0]
+            if len(parts) == 1:
+                whole.add(key)
+                if isinstance(value, dict) and value:
+                    stamped[path] = {**value, "meta": {**(value.get("meta") or {}), "updated_at": now}}
+                else:
+                    deleted.append(key)
+            elif len(parts) == 2 and parts[1] == "meta":
+                meta_whole.add(key)
+                stamped[path] = {**(value or {}), "updated_at": now}
+            else:
+                partial.add(key)
+
+        for key in partial - whole - meta_whole:
+            stamped[f"{key}/meta/updated_at"] = now
+        if deleted:
+            self.set_docs("Deleted", {key: now for key in deleted})
+        return stamped
+
+    def _catalog_replaced(self):
+        self.set_doc("Jobs", "catalog_reset", {"at": int(time.time())})
+
+    # --- movies ---
+    def all_movies(self) -> dict:
+        raise NotImplementedError
+
+    def all_movies_if_changed(self, etag: str | None) -> tuple[bool, dict | None, str | None]:
+        """(changed, catalog or None, etag); backends without ETags always return the catalog."""
+        return True, self.all_movies(), None
+
+    def catalog_version(self) -> int | None:
+        """Counter every writer bumps, or None if the backend has none (then only TTL reloads apply)."""
+        return None
+
+    def get_movie(self, key: str) -> dict | None:
+        raise NotImplementedError
+
+    def set_movie(self, key: str, data: dict):
+        raise NotImplementedError
+
+    def update_paths(self, updates: dict):
+        """Atomic multi-location update relative to the movies root."""
+        raise NotImplementedError
+
+    def delete_movie(self, key: str):
+        raise NotImplementedError
+
+    def import_movies(self, movies: dict):
+        """Replace the whole catalog (also used to copy between backends)."""
+        raise NotImplementedError
+
+    def update_movie(self, key: str, fields: dict):
+        self.update_paths({f"{key}/{path}": value for path, value in fields.items()})
+
+    def update_meta(self, key: str, fields: dict):
+        self.update_paths({f"{key}/meta/{path}": value for path, value in fields.items()})
+
+    def rename_movie(self, old_key: str, new_key: str, data: dict):
+        """Write `data` under new_key and remove old_key in one update."""
+        if old_key == new_key:
+            return self.set_movie(new_key, data)
+        self.update_paths({new_key: data, old_key: None})
+
+    def clear_movies(self):
+        self.import_movies({})
+
+    def keys_missing_poster(self) -> list[str]:
+        return [
+            key for key, data in self.all_movies().items()
+            if not ((data or {}).get("meta") or {}).get("poster")
+        ]
+
+    def keys_missing_year(self) -> list[str]:
+        return [
+            key for key, data in self.all_movies().items()
+            if not ((data or {}).get("meta") or {}).get("year")
+        ]
+
+    def find_by_normalized_title(self, title: str) -> str | None:
+        wanted = normalize_title(title)
+        for key in self.all_movies():
+            if normalize_title(key) == wanted:
+                return key
+        return None
+
+    def movies_added_since(self, timestamp: int) -> list[tuple[str, dict]]:
+        return [
+            (key, data) for key, data in self.all_movies().items()
+            if ((data or {}).get("meta") or {}).get("date_added", 0) > timestamp
+        ]
+
+    def movies_changed_since(self, timestamp: int) -> dict:
+        """Titles whose meta.updated_at (or, for older entries, meta.date_added) is after `timestamp`."""
+        changed = {}
+        for key, data in self.all_movies().items():
+            meta = (data or {}).get("meta") or {}
+            if max(meta.get("updated_at") or 0, meta.get("date_added") or 0) > timestamp:
+                changed[key] = data
+        return changed
+
+    def deleted_since(self, timestamp: int) -> dict:
+        """Tombstones {key: deleted_at} newer than `timestamp`."""
+        return {k: at for k, at in self.all_docs("Deleted").items() if isinstance(at, int) and at > timestamp}
+
+    def prune_deleted(self, before: int):
+        old = {k: None for k, at in self.all_docs("Deleted").items() if not isinstance(at, int) or at < before}
+        if old:
+            self.set_docs("Deleted", old)
+
+    def catalog_reset_at(self) -> int:
+        return (self.get_doc("Jobs", "catalog_reset") or {}).get("at", 0)
+
+    def delta_since(self, timestamp: int):
+        """(changed, deleted) since `timestamp`, or None if the catalog was replaced after it."""
+        if self.catalog_reset_at() >= timestamp:
+            return None
+        return self.movies_changed_since(timestamp), self.deleted_since(timestamp)
+
+    # --- keyed collections (Users, Requests, Reports) ---
+    def get_doc(self, collection: str, key: str):
+        raise NotImplementedError
+
+    def set_doc(self, collection: str, key: str, data):
+        raise NotImplementedError
+
+    def update_doc(self, collection: str, key: str, fields: dict):
+        raise NotImplementedError
+
+    def delete_doc(self, collection: str, key: str):
+        raise NotImplementedError
+
+    def transact_doc(self, collection: str, key: str, update):
+        """Replace a doc with update(current) atomically; `update` may be called more than once."""
+        self.set_doc(collection, key, update(self.get_doc(collection, key)))
+
+    def set_docs(self, collection: str, items: dict):
+        """Set (or, with None, delete) several docs of one collection."""
+        for key, data in items.items():
+            self.set_doc(collection, key, data)
+
+    def all_docs(self, collection: str) -> dict:
+        raise NotImplementedError
+
+    def count_docs(self, collection: str) -> int:
+        return len(self.all_docs(collection))
+
+    def docs_where(self, collection: str, field: str, value) -> dict:
+        """Docs of one collection whose top-level `field` equals `value`."""
+        return {k: d for k, d in self.all_docs(collection).items() if (d or {}).get(field) == value}
+
+    def get_user(self, user_id):
+        return self.get_doc("Users", str(user_id))
+
+    def save_user(self, user_id, data: dict):
+        self.set_doc("Users", str(user_id), data)
+
+    def all_user_ids(self) -> list[str]:
+        return list(self.all_docs("Users").keys())
+
+    def count_users(self) -> int:
+        return self.count_docs("Users")
+
+    def add_request(self, key: str, data: dict):
+        self.set_doc("Requests", key, data)
+
+    def all_requests(self) -> dict:
+        return self.all_docs("Requests")
+
+    def get_request_summary(self, key: str):
+        return self.get_doc("RequestSummary", key)
+
+    def save_request_summary(self, key: str, data: dict):
+        self.set_doc("RequestSummary", key, data)
+
+    def request_summaries(self) -> dict:
+        return self.all_docs("RequestSummary")
+
+    def get_report(self, key: str):
+        return self.get_doc("Reports", key)
+
+    def save_report(self, key: str, data: dict):
+        self.set_doc("Reports", key, data)
+
+    def update_report(self, key: str, update):
+        self.transact_doc("Reports", key, update)
+
+    def delete_report(self, key: str):
+        self.delete_doc("Reports", key)
+
+    def all_reports(self) -> dict:
+        return self.all_docs("Reports")
+
+
+class FirebaseStore(MovieStore):
+    """
+    Firebase Realtime Database backend (the original storage).
+    Every catalog write also increments /catalog_version in the same atomic update,
+    so other instances can check one small node instead of re-reading /movies.
+    """
+
+    VERSION_NODE = "catalog_version"
+    BUMP = {".sv": {"increment": 1}}  # server-side increment, safe with concurrent writers
+
+    def __init__(self):
+        super().__init__()
+        self.root = db.reference()
+        self.movies = db.reference("movies")
+
+    def all_movies(self):
+        return self.movies.get() or {}
+
+    def all_movies_if_changed(self, etag):
+        if etag is None:
+            data, etag = self.movies.get(etag=True)
+            return True, data or {}, etag
+        changed, data, etag = self.movies.get_if_changed(etag)  # 304: nothing but the ETag comes back
+        return changed, (data or {}) if changed else None, etag
+
+    def catalog_version(self):
+        return db.reference(self.VERSION_NODE).get() or 0
+
+    def get_movie(self, key):
+        return self.movies.child(key).get()
+
+    def set_movie(self, key, data):
+        self.update_paths({key: data})
+
+    def update_paths(self, updates):
+        if not updates:
+            return
+        updates = self._stamped(updates)
+        self.root.update({
+            **{f"movies/{path.strip('/')}": value for path, value in updates.items()},
+            self.VERSION_NODE: self.BUMP,
+        })
+        self._changed(updates)
+
+    def delete_movie(self, key):
+        self.update_paths({key: None})
+
+    def import_movies(self, movies):
+        self.root.update({"movies": movies or None, self.VERSION_NODE: self.BUMP})
+        self._catalog_replaced()
+        self._changed(None)
+
+    def movies_changed_since(self, timestamp):
+        # needs ".indexOn": ["meta/updated_at", "meta/date_added"] on /movies in the database rules
+        changed = self.movies.order_by_child("meta/date_added").start_at(timestamp + 1).get() or {}
+        changed.update(self.movies.order_by_child("meta/updated_at").start_at(timestamp + 1).get() or {})
+        return dict(changed)
+
+    def deleted_since(self, timestamp):
+        return dict(db.reference("Deleted").order_by_value().start_at(timestamp + 1).get() or {})
+
+    def prune_deleted(self, before):
+        old = db.reference("Deleted").order_by_value().end_at(before - 1).get() or {}
+        if old:
+            db.reference("Deleted").update({key: None for key in old})
+
+    def get_doc(self, collection, key):
+        return db.reference(collection).child(key).get()
+
+    def set_doc(self, collection, key, data):
+        db.reference(collection).child(key).set(data)
+
+    def update_doc(self, collection, key, fields):
+        db.reference(collection).child(key).update(fields)
+
+    def delete_doc(self, collection, key):
+        db.reference(collection).child(key).delete()
+
+    def transact_doc(self, collection, key, update):
+        # retried by the SDK until it commits against an unchanged value
+        db.reference(collection).child(key).transaction(update)
+
+    def set_docs(self, collection, items):
+        if items:
+            db.reference(collection).update(items)
+
+    def all_docs(self, collection):
+        return db.reference(collection).get() or {}
+
+    def count_docs(self, collection):
+        # shallow read: only the keys travel over the wire
+        return len(db.reference(collection).get(shallow=True) or {})
+
+    def docs_where(self, collection, field, value):
+        # needs ".indexOn": [field] on the collection in the database rules
+        return dict(db.reference(collection).order_by_child(field).equal_to(value).get() or {})
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS movies (
+    key TEXT PRIMARY KEY,
+    norm_title TEXT NOT NULL,
+    data TEXT NOT NULL,
+    date_added INTEGER,
+    year TEXT,
+    has_poster INTEGER NOT NULL DEFAULT 0,
+    updated_at INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_movies_norm_title ON movies(norm_title);
+CREATE INDEX IF NOT EXISTS idx_movies_date_added ON movies(date_added);
+CREATE INDEX IF NOT EXISTS idx_movies_year ON movies(year);
+CREATE INDEX IF NOT EXISTS idx_movies_has_poster ON movies(has_poster);
+CREATE TABLE IF NOT EXISTS docs (
+    collection TEXT NOT NULL,
+    key TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (collection, key)
+);
+"""
+
+
+class SqliteStore(MovieStore):
+    """Local SQLite backend with indexes on normalized title, date_added, year and poster status."""
+
+    def __init__(self, path: str):
+        super().__init__()
+        # timeout: BEGIN IMMEDIATE waits this long for another worker process's write
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self.lock = threading.RLock()
+        if path != ":memory:":
+            self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(movies)")}
+        if columns and "updated_at" not in columns:
+            self.conn.execute("ALTER TABLE movies ADD COLUMN updated_at INTEGER")
+        self.conn.executescript(SQLITE_SCHEMA)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_movies_updated_at ON movies(updated_at)")
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        """
+        BEGIN IMMEDIATE takes the file's write lock, so a read-modify-write inside
+        it is atomic across worker processes too, not just threads.
+        """
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.conn
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def _write(self, statements):
+        """Run (sql, params) pairs in one transaction."""
+        with self._transaction() as conn:
+            for sql, params in statements:
+                conn.execute(sql, params)
+
+    def _query(self, sql, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    @staticmethod
+    def _put_movie(key, data):
+        if not data:
+            return "DELETE FROM movies WHERE key = ?", (key,)
+        meta = data.get("meta") or {}
+        year = meta.get("year")
+        return (
+            "INSERT OR REPLACE INTO movies (key, norm_title, data, date_added, year, has_poster, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                key,
+                normalize_title(key),
+                json.dumps(data, ensure_ascii=False),
+                meta.get("date_added"),
+                str(year) if year else None,
+                1 if meta.get("poster") else 0,
+                meta.get("updated_at"),
+            ),
+        )
+
+    def all_movies(self):
+        rows = self._query("SELECT key, data FROM movies ORDER BY key")
+        return {key: json.loads(data) for key, data in rows}
+
+    def get_movie(self, key):
+        rows = self._query("SELECT data FROM movies WHERE key = ?", (key,))
+        return json.loads(rows[0][0]) if rows else None
+
+    def set_movie(self, key, data):
+        self.update_paths({key: data})
+
+    def update_paths(self, updates):
+        if not updates:
+            return
+        updates = self._stamped(updates)
+        grouped = {}
+        for path, value in updates.items():
+            key, _, rest = path.strip("/").partition("/")
+            grouped.setdefault(key, {})[rest] = value
+
+        with self._transaction() as conn:
+            for key, patches in grouped.items():
+                if "" in patches:
+                    data = patches.pop("")
+                    data = json.loads(json.dumps(data)) if isinstance(data, dict) else None
+                else:
+                    data = self.get_movie(key)
+                if patches:
+                    data = apply_updates(data or {}, patches)
+                conn.execute(*self._put_movie(key, data))
+        self._changed(updates)
+
+    def delete_movie(self, key):
+        self.update_paths({key: None})
+
+    def import_movies(self, movies):
+        statements = [("DELETE FROM movies", ())]
+        statements += [self._put_movie(key, data) for key, data in movies.items()]
+        self._write(statements)
+        self._catalog_replaced()
+        self._changed(None)
+
+    def movies_changed_since(self, timestamp):
+        rows = self._query(
+            "SELECT key, data FROM movies WHERE updated_at > ? OR date_added > ?", (timestamp, timestamp)
+        )
+        return {key: json.loads(data) for key, data in rows}
+
+    def keys_missing_poster(self):
+        return [r[0] for r in self._query("SELECT key FROM movies WHERE has_poster = 0 ORDER BY key")]
+
+    def keys_missing_year(self):
+        return [r[0] for r in self._query("SELECT key FROM movies WHERE year IS NULL ORDER BY key")]
+
+    def find_by_normalized_title(self, title):
+        rows = self._query("SELECT key FROM movies WHERE norm_title = ? LIMIT 1", (normalize_title(title),))
+        return rows[0][0] if rows else None
+
+    def movies_added_since(self, timestamp):
+        rows = self._query(
+            "SELECT key, data FROM movies WHERE date_added > ? ORDER BY key", (timestamp,)
+        )
+        return [(key, json.loads(data)) for key, data in rows]
+
+    def get_doc(self, collection, key):
+        rows = self._query("SELECT data FROM docs WHERE collection = ? AND key = ?", (collection, key))
+        return json.loads(rows[0][0]) if rows else None
+
+    def set_doc(self, collection, key, data):
+        if data is None:
+            return self.delete_doc(collection, key)
+        self._write([(
+            "INSERT OR REPLACE INTO docs (collection, key, data) VALUES (?, ?, ?)",
+            (collection, key, json.dumps(data, ensure_ascii=False)),
+        )])
+
+    def update_doc(self, collection, key, fields):
+        self.transact_doc(collection, key, lambda data: apply_updates(data or {}, fields) or None)
+
+    def delete_doc(self, collection, key):
+        self._write([("DELETE FROM docs WHERE collection = ? AND key = ?", (collection, key))])
+
+    def transact_doc(self, collection, key, update):
+        with self._transaction() as conn:
+            data = update(self.get_doc(collection, key))
+            if data is None:
+                conn.execute("DELETE FROM docs WHERE collection = ? AND key = ?", (collection, key))
+            else:
+                conn.execute(
+                    "INSERT OR REPLACE INTO docs (collection, key, data) VALUES (?, ?, ?)",
+                    (collection, key, json.dumps(data, ensure_ascii=False)),
+                )
+
+    def set_docs(self, collection, items):
+        statements = []
+        for key, data in items.items():
+            if data is None:
+                statements.append(("DELETE FROM docs WHERE collection = ? AND key = ?", (collection, key)))
+            else:
+                statements.append((
+                    "INSERT OR REPLACE INTO docs (collection, key, data) VALUES (?, ?, ?)",
+                    (collection, key, json.dumps(data, ensure_ascii=False)),
+                ))
+        if statements:
+            self._write(statements)
+
+    def all_docs(self, collection):
+        rows = self._query("SELECT key, data FROM docs WHERE collection = ? ORDER BY key", (collection,))
+        return {key: json.loads(data) for key, data in rows}
+
+    def count_docs(self, collection):
+        return self._query("SELECT COUNT(*) FROM docs WHERE collection = ?", (collection,))[0][0]
+
+    def docs_where(self, collection, field, value):
+        rows = self._query(
+            "SELECT key, data FROM docs WHERE collection = ? AND json_extract(data, ?) = ?",
+            (collection, f"$.{field}", value),
+        )
+        return {key: json.loads(data) for key, data in rows}
+
+
+storage = SqliteStore(SQLITE_PATH) if STORAGE_BACKEND == "sqlite" else FirebaseStore()
+
+
+# ------------------ shared worker state ------------------
+
+STATE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (
+    ns TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    expires_at REAL,
+    PRIMARY KEY (ns, key)
+);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+
+class SharedState:
+    """
+    SQLite file shared by every worker on the host: expiring key/values for
+    conversation state, counters (the catalog version) and leases (job locks and
+    leadership). Good for one host; every method is a single short statement.
+    """
+
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self.lock = threading.RLock()
+        if path != ":memory:":
+            self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(STATE_SCHEMA)
+
+    def _query(self, sql, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def _execute(self, sql, params=()) -> int:
+        with self.lock:
+            return self.conn.execute(sql, params).rowcount
+
+    # --- expiring key/values ---
+    def get(self, ns: str, key: str, default=None):
+        rows = self._query(
+            "SELECT value FROM kv WHERE ns = ? AND key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (ns, key, time.time()),
+        )
+        return json.loads(rows[0][0]) if rows else default
+
+    def set(self, ns: str, key: str, value, ttl: float | None = None):
+        self._execute(
+            "INSERT OR REPLACE INTO kv (ns, key, value, expires_at) VALUES (?, ?, ?, ?)",
+            (ns, key, json.dumps(value, ensure_ascii=False), time.time() + ttl if ttl else None),
+        )
+
+    def pop(self, ns: str, key: str, default=None):
+        rows = self._query(
+            "DELETE FROM kv WHERE ns = ? AND key = ? RETURNING value, expires_at", (ns, key)
+        )
+        if not rows or (rows[0][1] is not None and rows[0][1] <= time.time()):
+            return default
+        return json.loads(rows[0][0])
+
+    def keys(self, ns: str) -> list[str]:
+        rows = self._query(
+            "SELECT key FROM kv WHERE ns = ? AND (expires_at IS NULL OR expires_at > ?)", (ns, time.time())
+        )
+        return [r[0] for r in rows]
+
+    def purge_expired(self) -> int:
+        return self._execute("DELETE FROM kv WHERE expires_at <= ?", (time.time(),))
+
+    # --- counters ---
+    def incr(self, name: str) -> int:
+        return self._query(
+            "INSERT INTO counters (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1 RETURNING value",
+            (name,),
+        )[0][0]
+
+    def counter(self, name: str) -> int:
+        rows = self._query("SELECT value FROM counters WHERE name = ?", (name,))
+        return rows[0][0] if rows else 0
+
+    # --- leases ---
+    def acquire(self, name: str, owner: str, ttl: float) -> bool:
+        """Take or renew `name` for `owner`; fails while another owner's lease is unexpired."""
+        now = time.time()
+        return self._execute(
+            "INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+            "WHERE leases.owner = excluded.owner OR leases.expires_at <= ?",
+            (name, owner, now + ttl, now),
+        ) > 0
+
+    def release(self, name: str, owner: str):
+        self._execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner))
+
+    def owner(self, name: str) -> str | None:
+        rows = self._query("SELECT owner FROM leases WHERE name = ? AND expires_at > ?", (name, time.time()))
+        return rows[0][0] if rows else None
+
+    def held(self, prefix: str) -> dict:
+        """Unexpired leases whose name starts with `prefix`: {name: owner}."""
+        rows = self._query(
+            "SELECT name, owner FROM leases WHERE substr(name, 1, ?) = ? AND expires_at > ?",
+            (len(prefix), prefix, time.time()),
+        )
+        return dict(rows)
+
+
+_MISSING = object()
+
+
+class SharedDict(MutableMapping):
+    """Dict-like view of one SharedState namespace, so module-level state works across workers.
+    Keys are stored as strings and values as JSON; mutate values by assigning them back."""
+
+    def __init__(self, store: SharedState, ns: str, ttl: float | None = None):
+        self.store = store
+        self.ns = ns
+        self.ttl = ttl
+
+    def __getitem__(self, key):
+        value = self.store.get(self.ns, str(key), _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.store.set(self.ns, str(key), value, self.ttl)
+
+    def __delitem__(self, key):
+        if self.store.pop(self.ns, str(key), _MISSING) is _MISSING:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return self.store.get(self.ns, str(key), _MISSING) is not _MISSING
+
+    def __iter__(self):
+        return iter(self.store.keys(self.ns))
+
+    def __len__(self):
+        return len(self.store.keys(self.ns))
+
+    def get(self, key, default=None):
+        return self.store.get(self.ns, str(key), default)
+
+    def pop(self, key, default=_MISSING):
+        value = self.store.pop(self.ns, str(key), _MISSING)
+        if value is _MISSING:
+            if default is _MISSING:
+                raise KeyError(key)
+            return default
+        return value
+
+
+state = SharedState(STATE_PATH)
+
+
+def write_catalog_snapshot(path: str, payload: bytes):
+    """gzip `payload` to path via a temp file, so a crash never leaves half a snapshot."""
+    tmp = f"{path}.{os.getpid()}.tmp"  # per process, so two writers never share a temp file
+    with gzip.open(tmp, "wb", compresslevel=5) as f:
+        f.write(payload)
+    os.replace(tmp, path)
+
+
+def encode_catalog_snapshot(data: dict, saved_at: int) -> bytes:
+    """Header line, then one compact [key, entry] JSON line per title."""
+    header = {"format": 1, "backend": STORAGE_BACKEND, "saved_at": saved_at, "count": len(data)}
+    lines = [json.dumps(header)]
+    lines += [json.dumps([key, value], ensure_ascii=False, separators=(",", ":")) for key, value in data.items()]
+    return "\n".join(lines).encode("utf-8")
+
+
+def read_catalog_snapshot(path: str):
+    """Return (header, catalog) or None if there is no usable snapshot."""
+    try:
+        with gzip.open(path, "rb") as f:
+            raw = f.read()
+        header_line, _, body = raw.partition(b"\n")
+        header = json.loads(header_line)
+        if header.get("format") != 1 or header.get("backend") != STORAGE_BACKEND:
+            return None
+        # json.dumps escapes newlines inside strings, so each raw newline separates two entries;
+        # parsing them as one array is much faster than a json.loads per line
+        data = dict(json.loads(b"[" + body.replace(b"\n", b",") + b"]")) if body else {}
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logging.warning(f"Ignoring unreadable catalog snapshot {path}: {e}")
+        return None
+    return header, data
+
+
+class CatalogCache:
+    """
+    In-memory copy of the movies node.
+    Local writes are applied in place (write-through) and bump `version`.
+    The whole catalog is re-validated on first use and every CATALOG_TTL seconds to
+    pick up edits made elsewhere. When the store's catalog_version still matches ours
+    (our own writes included) that costs one tiny read; every CATALOG_ETAG_TTL seconds
+    an ETag-conditional read also catches edits that bypass the counter (console), and
+    a real reload bumps `loads` so derived indexes rebuild.
+    Subscribers get (key, old, new) for every title touched by a local write.
+    The first load comes from the on-disk snapshot plus a delta sync when one is usable.
+    With a SharedState, every write bumps a shared counter; other workers see it within
+    CATALOG_SYNC_SECONDS and pull just the changed titles, notifying subscribers per title.
+    Other instances are noticed the same way through the store's catalog_version
+    (see sync_remote).
+    """
+
+    SHARED_VERSION = "catalog_version"
+
+    def __init__(self, store: MovieStore, ttl: int, snapshot_path: str = "", state: SharedState | None = None):
+        self.store = store
+        self.ttl = ttl
+        self.snapshot_path = snapshot_path
+        self.snapshot_version = None  # catalog version last written to the snapshot
+        self.state = state
+        self.seen_version = None  # shared version our copy reflects
+        self.remote_version = None  # store catalog_version our copy reflects
+        self.etag = None  # ETag of the last full read
+        self.etag_checked_at = 0.0  # wall time of the last full or ETag-conditional read
+        self.synced_at = 0.0  # wall time the last load or sync started
+        self.checked_at = 0.0
+        self.syncs = 0
+        self.not_modified = 0
+        self.data = None
+        self.loaded_at = 0.0
+        self.version = 0
+        self.loads = 0
+        self.subscribers = []
+        store.listeners.append(self.apply)
+
+    def get(self) -> dict:
+        if self.data is None or time.time() - self.loaded_at > self.ttl:
+            self.reload()
+        elif self.state is not None and time.monotonic() - self.checked_at >= CATALOG_SYNC_SECONDS:
+            self.sync_shared()
+        return self.data
+
+    def current_version(self) -> int:
+        self.get()
+        return self.version
+
+    def invalidate(self):
+        """Drop the cached copy; the next get() re-reads the catalog."""
+        self.data = None
+
+    def reload(self):
+        if self.state is not None:
+            self.seen_version = self.state.counter(self.SHARED_VERSION)
+            self.checked_at = time.monotonic()
+        started = time.time()
+        # read before the catalog, so a write in between shows up as a newer version later
+        try:
+            version = self.store.catalog_version()
+        except Exception as e:
+            logging.warning(f"Reading catalog_version failed: {e}")
+            version = None
+        if (
+            self.data is not None and version is not None and version == self.remote_version
+            and started - self.etag_checked_at < CATALOG_ETAG_TTL
+        ):
+            # no writer anywhere bumped the counter past what our copy already holds
+            self.synced_at = started
+            self.loaded_at = time.time()
+            self.not_modified += 1
+            return
+        self.remote_version = version
+        if self.loads == 0 and self.snapshot_path and self.warm_start():
+            self.synced_at = self.etag_checked_at = started
+            return
+
+        conditional = self.data is not None and self.etag is not None
+        changed, data, etag = self.store.all_movies_if_changed(self.etag if conditional else None)
+        self.synced_at = self.etag_checked_at = started
+        self.loaded_at = time.time()
+        self.etag = etag
+        if not changed:  # nothing was written anywhere since our copy, which is therefore current
+            self.not_modified += 1
+            return
+        self.data = data
+        self.loads += 1
+        self.version += 1
+
+    def warm_start(self) -> bool:
+        """Load the snapshot and fetch only titles changed or deleted since it was written."""
+        started = time.perf_counter()
+        snapshot = read_catalog_snapshot(self.snapshot_path)
+        if snapshot is None:
+            return False
+        header, data = snapshot
+        since = int(header.get("saved_at", 0)) - SNAPSHOT_SKEW
+        if time.time() - since > SNAPSHOT_MAX_AGE:
+            return False
+
+        try:
+            delta = self.store.delta_since(since)
+        except Exception as e:
+            logging.warning(f"Delta sync failed, loading the full catalog: {e}")
+            return False
+        if delta is None:
+            return False
+        changed, deleted = delta
+
+        data.update(changed)
+        for key in deleted:
+            if key not in changed:  # changed entries are current, so a re-added title survives its tombstone
+                data.pop(key, None)
+
+        self.data = data
+        self.loaded_at = time.time()
+        self.loads += 1
+        self.version += 1
+        logging.info(
+            f"Catalog warm start: {len(data)} titles from snapshot, {len(changed)} changed, "
+            f"{len(deleted)} deleted in {(time.perf_counter() - started) * 1000:.0f} ms"
+        )
+        return True
+
+    def sync_shared(self):
+        """Apply titles other workers changed since our last load or sync."""
+        self.checked_at = time.monotonic()
+        version = self.state.counter(self.SHARED_VERSION)
+        if version == self.seen_version:
+            return
+        started = time.time()
+        try:
+            delta = self.store.delta_since(int(self.synced_at) - SNAPSHOT_SKEW)
+        except Exception as e:
+            logging.warning(f"Catalog sync failed, keeping the cached copy: {e}")
+            return
+        if delta is None:
+            self.reload()
+            return
+        self.seen_version = version
+        self.apply_delta(started, *delta)
+
+    async def sync_remote(self) -> bool:
+        """
+        Check the store's catalog_version (one tiny read) and pull the delta if another
+        instance wrote; this instance's own writes advance remote_version in apply().
+        The reads run in a thread; the result is only applied if no local write landed
+        meanwhile, otherwise the next check retries.
+        """
+        if self.data is None:
+            return False
+        version = await asyncio.to_thread(self.store.catalog_version)
+        if version is None or version == self.remote_version:
+            return False
+        started = time.time()
+        before = self.version
+        delta = await asyncio.to_thread(self.store.delta_since, int(self.synced_at) - SNAPSHOT_SKEW)
+        if self.data is None or self.version != before:
+            return False
+        if delta is None:
+            self.reload()
+            return True
+        # a local write after the version read already advanced remote_version past it
+        self.remote_version = max(version, self.remote_version or 0)
+        self.apply_delta(started, *delta)
+        return True
+
+    def apply_delta(self, started: float, changed: dict, deleted: dict):
+        self.synced_at = started
+        self.syncs += 1
+        touched = []
+        for key, new in changed.items():
+            old = self.data.get(key)
+            if old != new:
+                self.data[key] = new
+                touched.append((key, old, new))
+        for key in deleted:
+            if key not in changed and key in self.data:
+                touched.append((key, self.data.pop(key), None))
+        if not touched:
+            return
+        self.version += 1
+        for key, old, new in touched:
+            for callback in self.subscribers:
+                callback(key, old, new)
+
+    def stats(self) -> str:
+        text = f"{self.not_modified} reloads skipped (not modified), {self.syncs} delta syncs"
+        if self.remote_version is not None:
+            text += f", store version {self.remote_version}"
+        if self.state is not None:
+            text += f", shared version {self.seen_version}"
+        return text
+
+    async def save_snapshot(self) -> bool:
+        """Write the in-memory catalog to disk if it changed since the last snapshot."""
+        if not self.snapshot_path or self.data is None or self.snapshot_version == self.version:
+            return False
+        version = self.version
+        # our copy is only known complete as of the last load or sync; a warm start must
+        # fetch everything written since then, including by other instances
+        saved_at = int(self.synced_at)
+        # encode on the loop (the dicts can change under a thread); compress and write off it
+        payload = encode_catalog_snapshot(self.data, saved_at)
+        await asyncio.to_thread(write_catalog_snapshot, self.snapshot_path, payload)
+        self.snapshot_version = version
+        return True
+
+    def apply(self, updates):
+        if self.state is not None:
+            shared = self.state.incr(self.SHARED_VERSION)
+            if self.seen_version == shared - 1:  # nobody else wrote in between
+                self.seen_version = shared
+        if self.remote_version is not None:
+            self.remote_version += 1  # our write bumped the store's counter too; don't fetch it back
+        if self.data is None:
+            return
+        if updates is None:  # whole catalog replaced
+            self.invalidate()
+            self.version += 1
+            return
+
+        touched = {split_path(path)[0] for path in updates}
+        before = {}
+        if self.subscribers:
+            before = {key: copy.deepcopy(self.data.get(key)) for key in touched}
+
+        apply_updates(self.data, updates)
+        for key in touched:
+            if self.data.get(key) == {}:
+                self.data.pop(key)
+        self.version += 1
+
+        for key in touched:
+            for callback in self.subscribers:
+                callback(key, before.get(key), self.data.get(key))
+
+
+class LRUCache:
+    """OrderedDict LRU. Entries carry a version; a version mismatch counts as a miss."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version=None):
+        entry = self.entries.get(key)
+        if entry is None or entry[0] != version:
+            self.misses += 1
+            if entry is not None:
+                del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key, value, version=None):
+        self.entries[key] = (version, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def stats(self) -> str:
+        lookups = self.hits + self.misses
+        rate = (self.hits / lookups * 100) if lookups else 0
+        return f"{len(self.entries)}/{self.maxsize} entries, {self.hits} hits, {self.misses} misses ({rate:.0f}% hit rate)"
+
+
+class TokenBucket:
+    __slots__ = ("capacity", "rate", "tokens", "updated")
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, cost: float) -> float:
+        """Seconds until `cost` tokens are available (0 if they are now)."""
+        return max(0.0, (min(cost, self.capacity) - self.tokens) / self.rate) if self.rate else float("inf")
+
+
+class RateLimiter:
+    """
+    Per-user token buckets plus one global bucket shielding Firebase/TMDB.
+    Only the RATE_LIMIT_MAX_USERS most recently active users keep a bucket;
+    an evicted user comes back with a full one, which is what an idle user would have anyway.
+    """
+
+    def __init__(self, burst: float, refill: float, global_rate: float, max_users: int):
+        self.burst = burst
+        self.refill = refill
+        self.max_users = max_users
+        self.buckets = OrderedDict()
+        self.global_bucket = TokenBucket(global_rate * 2, global_rate)
+        self.allowed = 0
+        self.throttled = 0
+        self.notified = {}  # user_id -> monotonic time until which we stay quiet
+
+    def acquire(self, user_id: int, cost: float):
+        """Spend `cost` tokens. Returns (None, 0) if allowed, else ("user" | "global", retry_after)."""
+        now = time.monotonic()
+        bucket = self.buckets.get(user_id)
+        if bucket is None:
+            bucket = self.buckets[user_id] = TokenBucket(self.burst, self.refill)
+            while len(self.buckets) > self.max_users:
+                evicted, _ = self.buckets.popitem(last=False)
+                self.notified.pop(evicted, None)
+        else:
+            self.buckets.move_to_end(user_id)
+
+        bucket.refill(now)
+        self.global_bucket.refill(now)
+        cost = min(cost, bucket.capacity)
+
+        if bucket.tokens < cost:
+            self.throttled += 1
+            return "user", bucket.wait_time(cost)
+        if self.global_bucket.tokens < cost:
+            self.throttled += 1
+            return "global", self.global_bucket.wait_time(cost)
+
+        bucket.tokens -= cost
+        self.global_bucket.tokens -= cost
+        self.allowed += 1
+        return None, 0
+
+    def should_notify(self, user_id: int, retry_after: float) -> bool:
+        """Tell a throttled user once per throttle window rather than once per message."""
+        now = time.monotonic()
+        if self.notified.get(user_id, 0) > now:
+            return False
+        self.notified[user_id] = now + max(retry_after, 1)
+        return True
+
+    def stats(self) -> str:
+        return f"{len(self.buckets)} users tracked, {self.allowed} allowed, {self.throttled} throttled"
+
+
+class SendScheduler:
+    """
+    Single outbound queue for bot messages.
+    Jobs run in priority order under a global and a per-chat token bucket; a chat
+    has at most one send in flight so its messages keep their order. On RetryAfter
+    the whole queue pauses and the job is retried in its original place.
+    """
+
+    INTERACTIVE, NOTIFY, PROGRESS, BROADCAST = range(4)
+
+    def __init__(self, global_rate: float, chat_rate: float, chat_burst: float, max_chats: int = 10000):
+        self.heap = []  # (priority, seq, chat_id, call, future)
+        self.seq = itertools.count()
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_chats = max_chats
+        self.chat_buckets = OrderedDict()
+        self.busy = set()  # chats with a send in flight
+        self.progress_state = {}  # (chat_id, key) -> {"message_id", "text", "pending", "queued"}
+        self.paused_until = 0.0
+        self.wakeup = asyncio.Event()
+        self.worker = None
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.coalesced = 0
+
+    def enqueue(self, priority: int, chat_id: int, call, future: bool = True):
+        """Queue `call()` (a coroutine factory). Returns a future for its result when `future` is set."""
+        fut = asyncio.get_running_loop().create_future() if future else None
+        heapq.heappush(self.heap, (priority, next(self.seq), chat_id, call, fut))
+        if self.worker is None or self.worker.done():
+            self.wakeup = asyncio.Event()  # bound to the running loop
+            self.worker = spawn(self._run())
+        self.wakeup.set()
+        return fut
+
+    async def send(self, bot, chat_id: int, text: str, priority: int = INTERACTIVE, **kwargs):
+        return await self.enqueue(
+            priority, chat_id, functools.partial(bot.send_message, chat_id=chat_id, text=text, **kwargs)
+        )
+
+    def progress(self, bot, chat_id: int, key: str, text: str, **kwargs):
+        """Show `text` in one status message per (chat, key), editing it; queued updates collapse into the latest."""
+        state = self.progress_state.setdefault(
+            (chat_id, key), {"message_id": None, "text": None, "pending": None, "queued": False}
+        )
+        state["pending"] = (text, kwargs)
+        if state["queued"]:
+            self.coalesced += 1
+            return
+        state["queued"] = True
+
+        async def call():
+            state["queued"] = False
+            text, kwargs = state["pending"]
+            if text == state["text"]:
+                return
+            if state["message_id"] is None:
+                msg = await bot.send_message(chat_id=chat_id, text=text, **kwargs)
+                state["message_id"] = msg.message_id
+            else:
+                await bot.edit_message_text(chat_id=chat_id, message_id=state["message_id"], text=text, **kwargs)
+            state["text"] = text
+
+        self.enqueue(self.PROGRESS, chat_id, call, future=False)
+
+    def end_progress(self, chat_id: int, key: str):
+        """Forget the status message so the next progress() starts a new one."""
+        self.progress_state.pop((chat_id, key), None)
+
+    def _chat_bucket(self, chat_id):
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self.chat_buckets[chat_id] = TokenBucket(self.chat_burst, self.chat_rate)
+            while len(self.chat_buckets) > self.max_chats:
+                self.chat_buckets.popitem(last=False)
+        else:
+            self.chat_buckets.move_to_end(chat_id)
+        return bucket
+
+    def _pop_ready(self, now: float, scan: int = 100):
+        """Pop the best job whose chat can take a message now; also return the shortest chat wait."""
+        deferred = []
+        found = None
+        wait = None
+        while self.heap and len(deferred) < scan:
+            job = heapq.heappop(self.heap)
+            chat_id = job[2]
+            if chat_id in self.busy:
+                deferred.append(job)
+                continue
+            bucket = self._chat_bucket(chat_id)
+            bucket.refill(now)
+            if bucket.tokens < 1:
+                deferred.append(job)
+                chat_wait = bucket.wait_time(1)
+                wait = chat_wait if wait is None else min(wait, chat_wait)
+                continue
+            bucket.tokens -= 1
+            found = job
+            break
+        for job in deferred:
+            heapq.heappush(self.heap, job)
+        return found, wait
+
+    async def _run(self):
+        while True:
+            if not self.heap:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+
+            now = time.monotonic()
+            if self.paused_until > now:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+
+            self.global_bucket.refill(now)
+            if self.global_bucket.tokens < 1:
+                await asyncio.sleep(self.global_bucket.wait_time(1))
+                continue
+
+            job, wait = self._pop_ready(now)
+            if job is None:
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=wait or 1)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self.global_bucket.tokens -= 1
+            self.busy.add(job[2])
+            spawn(self._deliver(job))
+
+    async def _deliver(self, job):
+        priority, seq, chat_id, call, fut = job
+        try:
+            result = await call()
+        except RetryAfter as e:
+            delay = e.retry_after.total_seconds() if hasattr(e.retry_after, "total_seconds") else e.retry_after
+            self.paused_until = max(self.paused_until, time.monotonic() + float(delay))
+            self.retried += 1
+            heapq.heappush(self.heap, job)
+            logging.warning(f"Flood control: pausing sends for {delay}s (chat {chat_id})")
+        except Exception as e:
+            self.failed += 1
+            if fut is not None:
+                if not fut.done():
+                    fut.set_exception(e)
+            else:
+                logging.warning(f"Send to {chat_id} failed: {e}")
+        else:
+            self.sent += 1
+            if fut is not None and not fut.done():
+                fut.set_result(result)
+        finally:
+            self.busy.discard(chat_id)
+            self.wakeup.set()
+
+    def stats(self) -> str:
+        return (
+            f"{len(self.heap)} queued, {self.sent} sent, {self.failed} failed, "
+            f"{self.retried} flood retries, {self.coalesced} progress edits coalesced"
+        )
+
+
+class DeletionScheduler:
+    """
+    One heap of (due, chat_id, message_id) drained by a single task, instead of a
+    sleeping task per message. Due deletions are grouped per chat into
+    delete_messages calls on the outbox, and the pending set is saved to
+    Jobs/pending_deletes every DELETE_FLUSH_SECONDS so a restart doesn't lose it.
+    Each worker saves under its own slot (`doc`), so workers don't overwrite each other;
+    the leader adopts the doc of a slot whose worker died (see adopt_orphaned_deletions).
+    """
+
+    DOC = "pending_deletes"
+
+    def __init__(self, batch_window: float, flush_interval: float):
+        self.doc = self.DOC
+        self.heap = []
+        self.batch_window = batch_window
+        self.flush_interval = flush_interval
+        self.dirty = False
+        self.last_flush = 0.0
+        self.bot = None
+        self.wakeup = asyncio.Event()
+        self.worker = None
+        self.deleted = 0
+
+    def schedule(self, bot, chat_id: int, message_id: int, delay: float = TEMP_MESSAGE_SECONDS):
+        self.bot = bot
+        entry = (time.time() + delay, chat_id, message_id)
+        heapq.heappush(self.heap, entry)
+        self.dirty = True
+        if self.worker is None or self.worker.done():
+            self.wakeup = asyncio.Event()  # bound to the running loop
+            self.worker = spawn(self._run())
+        if self.heap[0] is entry:
+            self.wakeup.set()
+
+    @classmethod
+    def slot_doc(cls, slot: int) -> str:
+        return cls.DOC if slot == 0 else f"{cls.DOC}_{slot}"
+
+    def _load(self, bot, doc: str) -> int:
+        """Push the deletions persisted under `doc` onto the heap; overdue ones go out right away."""
+        items = (storage.get_doc("Jobs", doc) or {}).get("items") or {}
+        loaded = 0
+        for ref, due in items.items():
+            chat_id, _, message_id = ref.rpartition(":")
+            try:
+                heapq.heappush(self.heap, (float(due), int(chat_id), int(message_id)))
+                loaded += 1
+            except ValueError:
+                continue
+        if loaded:
+            self.bot = bot
+            if self.worker is None or self.worker.done():
+                self.wakeup = asyncio.Event()
+                self.worker = spawn(self._run())
+            else:
+                self.wakeup.set()
+        return loaded
+
+    def restore(self, bot):
+        """Reload deletions persisted by a previous process in this slot."""
+        if self._load(bot, self.doc):
+            logging.info(f"Restored {len(self.heap)} pending message deletions")
+
+    def adopt(self, bot, doc: str) -> int:
+        """Take over the deletions a dead worker persisted under `doc`, then drop its doc."""
+        if doc == self.doc:
+            return 0
+        loaded = self._load(bot, doc)
+        if loaded:
+            self.flush()  # saved under our slot before the orphan's doc goes away
+        storage.delete_doc("Jobs", doc)
+        return loaded
+
+    def flush(self):
+        items = {f"{chat_id}:{message_id}": int(due) for due, chat_id, message_id in self.heap}
+        try:
+            if items:
+                storage.set_doc("Jobs", self.doc, {"items": items})
+            else:
+                storage.delete_doc("Jobs", self.doc)
+            self.dirty = False
+        except Exception as e:
+            logging.warning(f"Saving pending deletions failed: {e}")
+        self.last_flush = time.monotonic()
+
+    def _delete_due(self, now: float):
+        by_chat = defaultdict(list)
+        while self.heap and self.heap[0][0] <= now:
+            _, chat_id, message_id = heapq.heappop(self.heap)
+            by_chat[chat_id].append(message_id)
+        for chat_id, message_ids in by_chat.items():
+            for i in range(0, len(message_ids), 100):  # Bot API limit per delete_messages call
+                outbox.enqueue(SendScheduler.PROGRESS, chat_id, functools.partial(
+                    self.bot.delete_messages, chat_id=chat_id, message_ids=message_ids[i:i + 100]
+                ), future=False)
+            self.deleted += len(message_ids)
+        if by_chat:
+            self.dirty = True
+
+    async def _run(self):
+        while True:
+            self._delete_due(time.time())
+            if self.dirty and time.monotonic() - self.last_flush >= self.flush_interval:
+                self.flush()
+
+            timeout = None
+            if self.heap:
+                timeout = max(0.0, self.heap[0][0] - time.time()) + self.batch_window
+            if self.dirty:
+                timeout = min(timeout or self.flush_interval, self.flush_interval)
+
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self) -> str:
+        return f"{len(self.heap)} pending, {self.deleted} deleted"
+
+
+catalog = CatalogCache(storage, CATALOG_TTL, SNAPSHOT_PATH, state)
+search_cache = LRUCache(SEARCH_CACHE_SIZE)  # normalized query -> ranked keys
+inline_cache = LRUCache(SEARCH_CACHE_SIZE)  # normalized inline query -> built results
+rate_limiter = RateLimiter(RATE_LIMIT_BURST, RATE_LIMIT_REFILL, RATE_LIMIT_GLOBAL / WORKERS, RATE_LIMIT_MAX_USERS)
+outbox = SendScheduler(SEND_GLOBAL_PER_SECOND / WORKERS, SEND_CHAT_PER_SECOND, SEND_CHAT_BURST)
+deletions = DeletionScheduler(DELETE_BATCH_WINDOW, DELETE_FLUSH_SECONDS)
 app = FastAPI()
 telegram_app = Application.builder().token(TOKEN).build()
 
-user_last_bot_message = {}
-pending_reports = {}  # user_id -> title_being_reported
-last_user_message_time = {}
-user_movie_offset = {}  # For pagination
-movie_requests = {}  # user_id -> timestamp for rate limiting
-user_reported_movies = {}
+# per-user conversation state lives in `state` so any worker can serve the next update
+user_last_bot_message = SharedDict(state, "last_bot_message", ttl=48 * 3600)  # Telegram can't delete older ones
+pending_reports = SharedDict(state, "pending_reports", ttl=CONVERSATION_TTL)  # user_id -> {"title", "quality"}
+movie_requests = SharedDict(state, "movie_requests", ttl=300)  # user_id -> timestamp for rate limiting
+conversations = SharedDict(state, "user_data", ttl=CONVERSATION_TTL)  # user_id -> context.user_data
+stop_requests = SharedDict(state, "stop", ttl=CONVERSATION_TTL)  # job id -> True, checked by whichever worker runs it
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+held_leases = set()  # renewed by lease_loop
+LEADER_LEASE = "leader"
+REPORT_DIGEST_MINUTES = int(os.getenv("REPORT_DIGEST_MINUTES", "60"))
+REPORT_DIGEST_TOP = 15
+REPORT_REASONS_KEPT = 5
+REPORT_USERS_KEPT = 500  # most recent reporters remembered per title for de-duplication
+
+LINK_CHECK_CONCURRENCY = int(os.getenv("LINK_CHECK_CONCURRENCY", "50"))
+LINK_CHECK_HOST_RPS = float(os.getenv("LINK_CHECK_HOST_RPS", "10"))  # requests/second per host
+LINK_CHECK_MAX_AGE = int(os.getenv("LINK_CHECK_MAX_AGE_HOURS", "24")) * 3600
+LINK_CHECK_TIMEOUT = 15
+LINK_CHECK_CHUNK = 200  # titles per checkpoint and multi-path write
+LINK_CHECK_WINDOW = 5  # chunks in flight at once
+LINK_CHECK_JOB = "checklinks"
+LINK_CHECK_LEASE = "job:checklinks"
+link_check_task = None
+UPLOAD_JOBS = "Uploads"  # collection of /uploadbulk jobs, keyed by creation time in ms
+UPLOAD_LEASE = "job:uploads"
+upload_task = None
+upload_files = {}  # job_id -> lines, kept from the handler so a fresh job doesn't re-download
 MOVIES_PER_PAGE = 10
-missing_posters_offset = {}
+missing_posters_offset = SharedDict(state, "missing_posters_offset", ttl=CONVERSATION_TTL)
 POSTERS_PER_PAGE = 10
-missing_year_offset = {}
+missing_year_offset = SharedDict(state, "missing_year_offset", ttl=CONVERSATION_TTL)
 MISSING_YEAR_PER_PAGE = 50
+search_results = SharedDict(state, "search_results", ttl=CONVERSATION_TTL)  # search id -> {"query", "version", "keys"}
+REQUESTS_PER_PAGE = 15
+REQUEST_MATCH_CUTOFF = 0.9  # fuzzy ratio for matching uploads to open requests
+SEARCH_RESULTS_PER_PAGE = 10
+INLINE_RESULTS = 20
+INLINE_CACHE_SECONDS = 300  # how long Telegram may reuse an inline answer
 GETFILEID_MODE = {}
+SLOW_HANDLER_SECONDS = float(os.getenv("SLOW_HANDLER_SECONDS", "1.0"))
+PROFILE_MAX_SECONDS = 300
+active_profiler = None
+background_tasks = set()  # strong refs so fire-and-forget tasks aren't GC'd
+http_client = None  # created lazily by get_http_client()
+callback_index = {"loads": None, "index": {}}  # movie|<id> -> catalog key
+title_lookup = {"loads": None, "index": {}}  # lowercased title -> catalog key, for uploads
+title_matcher = {"loads": None, "matcher": None}  # fuzzy index, rebuilt when the catalog is reloaded
+CALLBACK_DATA_BYTES = 64  # Telegram's limit on callback_data
 
 
 
@@ -90,8 +1721,7 @@ def save_user_if_not_exists(update, context):
 
     user_id = str(user.id)
 
-    user_ref = db.reference("Users").child(user_id)
-    existing = user_ref.get()
+    existing = storage.get_user(user_id)
 
     if existing:
         # User already exists → do nothing
@@ -105,7 +1735,7 @@ def save_user_if_not_exists(update, context):
         "joined_at": datetime.utcnow().isoformat()
     }
 
-    user_ref.set(user_data)
+    storage.save_user(user_id, user_data)
 
 
 def ensure_user_saved(update, context):
@@ -117,6 +1747,242 @@ def ensure_user_saved(update, context):
     except Exception:
         pass
 
+
+def spawn(coro):
+    """Run a coroutine in the background, keeping a reference until it finishes."""
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+
+def hold_lease(name: str) -> bool:
+    """Take (or keep) a shared lease for this worker; lease_loop renews it until drop_lease."""
+    if state.acquire(name, WORKER_ID, LEASE_TTL):
+        held_leases.add(name)
+        return True
+    return False
+
+
+def drop_lease(name: str):
+    held_leases.discard(name)
+    state.release(name, WORKER_ID)
+
+
+def still_holds(name: str) -> bool:
+    """Renew `name` now; False (and forgotten) if another worker took it over meanwhile.
+    Long jobs call this before every unit of work so a job never runs in two workers."""
+    if name in held_leases and state.acquire(name, WORKER_ID, LEASE_TTL):
+        return True
+    if name in held_leases:
+        held_leases.discard(name)
+        logging.warning(f"Lost lease {name} to {state.owner(name)}; stopping here")
+    return False
+
+
+def is_leader() -> bool:
+    """Exactly one worker runs the periodic loops (snapshots, digests, resuming jobs)."""
+    return LEADER_LEASE in held_leases
+
+
+def claim_worker_slot() -> int:
+    """Smallest free slot number; stable across restarts, so each worker finds its own persisted state."""
+    slot = 0
+    while not hold_lease(f"slot:{slot}"):
+        slot += 1
+    return slot
+
+
+def adopt_orphaned_deletions(slots: list[int]):
+    """Leader: move the persisted deletions of slots nobody holds any more into this worker's queue."""
+    for slot in slots:
+        if state.owner(f"slot:{slot}") is not None:  # restarted into its old slot; it restores its own
+            continue
+        adopted = deletions.adopt(telegram_app.bot, DeletionScheduler.slot_doc(slot))
+        if adopted:
+            logging.info(f"Adopted {adopted} pending message deletions from dead slot {slot}")
+
+
+def persisted_deletion_slots() -> list[int]:
+    """Slots that have a pending-deletions doc in Jobs."""
+    slots = []
+    for doc in storage.all_docs("Jobs"):
+        if doc == DeletionScheduler.DOC:
+            slots.append(0)
+        elif doc.startswith(f"{DeletionScheduler.DOC}_") and doc.rpartition("_")[2].isdigit():
+            slots.append(int(doc.rpartition("_")[2]))
+    return slots
+
+
+async def lease_loop():
+    """Background task: renew held leases, take over leadership, and let the leader resume orphaned jobs."""
+    job_owners = {}  # job lease -> owner seen on the previous pass
+    slots_held = set(state.held("slot:"))  # slot leases alive on the previous pass
+    while True:
+        await asyncio.sleep(LEASE_TTL / 3)
+        try:
+            for name in list(held_leases):
+                if not state.acquire(name, WORKER_ID, LEASE_TTL):
+                    held_leases.discard(name)
+                    logging.warning(f"Lost lease {name} to {state.owner(name)}")
+            became_leader = not is_leader() and hold_lease(LEADER_LEASE)
+            if became_leader:
+                logging.info(f"👑 Worker {WORKER_ID} is now the leader")
+            if not is_leader():
+                continue
+            state.purge_expired()
+            # a slot lease that expired means its worker died; a restart usually lands in another slot
+            slots_now = set(state.held("slot:"))
+            orphaned = [int(name.partition(":")[2]) for name in slots_held - slots_now]
+            slots_held = slots_now
+            if became_leader:
+                orphaned = persisted_deletion_slots()
+            if orphaned:
+                adopt_orphaned_deletions(orphaned)
+            # a job lease that just went free means its worker finished or died; the job doc tells which
+            for name, resume in ((LINK_CHECK_LEASE, resume_link_check), (UPLOAD_LEASE, resume_uploads)):
+                owner = state.owner(name)
+                if owner is None and (became_leader or job_owners.get(name)):
+                    await resume()
+                job_owners[name] = owner
+        except Exception as e:
+            logging.warning(f"Lease renewal failed: {e}")
+
+
+def shared_user_data(callback):
+    """Load context.user_data from `conversations` before the handler and save it back after,
+    so a multi-step prompt can continue on whichever worker gets the next update."""
+
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        user = getattr(update, "effective_user", None)
+        if user is None or context.user_data is None:
+            return await callback(update, context)
+        before = conversations.get(user.id) or {}
+        context.user_data.clear()
+        context.user_data.update(before)
+        try:
+            return await callback(update, context)
+        finally:
+            after = dict(context.user_data)
+            if after != before:
+                if after:
+                    conversations[user.id] = after
+                else:
+                    conversations.pop(user.id, None)
+
+    return wrapper
+
+
+def describe_update(update) -> str:
+    """Short label for an update: callback prefix, /command, or message kind."""
+    query = getattr(update, "callback_query", None)
+    if query and query.data:
+        return f"cb:{query.data.split('|', 1)[0]}"
+
+    message = getattr(update, "message", None)
+    if message:
+        if message.text and message.text.startswith("/"):
+            return message.text.split()[0][:32]
+        if message.document:
+            return "document"
+        if message.text:
+            return "text"
+    return "other"
+
+
+def timed_handler(callback):
+    """Wrap a handler callback and log updates slower than SLOW_HANDLER_SECONDS."""
+    name = getattr(callback, "__name__", repr(callback))
+
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        started = time.perf_counter()
+        try:
+            return await callback(update, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            if elapsed >= SLOW_HANDLER_SECONDS:
+                logger.warning(
+                    f"SLOW HANDLER | {name} | {describe_update(update)} | {elapsed * 1000:.0f} ms"
+                )
+
+    return wrapper
+
+
+# token cost per handler callback; anything not listed costs 1
+COMMAND_COSTS = {
+    "search_movie": 3,
+    "handle_title_or_search": 2,  # usually a search; prompt replies fit easily in the burst
+    "getpdf": 10,
+    "getpdfrecent": 10,
+    "list_movies": 2,
+    "request_movie": 2,
+    "view_requests": 2,
+    "inline_search": 0.5,  # Telegram sends one per keystroke
+}
+
+
+async def notify_throttled(update, scope: str, retry_after: float):
+    wait = max(1, int(retry_after + 0.999))
+    if scope == "global":
+        text = f"🚦 The bot is very busy right now. Please try again in {wait}s."
+    else:
+        text = f"⏳ You're going too fast. Please wait {wait}s and try again."
+    try:
+        if update.callback_query:
+            await update.callback_query.answer(text, show_alert=False)
+        elif update.effective_message:
+            await update.effective_message.reply_text(text)
+    except Exception as e:
+        logging.warning(f"Throttle notice failed: {e}")
+
+
+def rate_limited(callback, cost: float):
+    """Wrap a handler callback so each update spends `cost` tokens from the user's bucket."""
+
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        user = update.effective_user
+        if user is None or user.id == ADMIN_ID:
+            return await callback(update, context)
+
+        scope, retry_after = rate_limiter.acquire(user.id, cost)
+        if scope is None:
+            return await callback(update, context)
+
+        hot_log.log(logging.INFO, "ratelimit.throttled",
+                    f"THROTTLED | {scope} | {user.id} | {describe_update(update)} | retry in {retry_after:.1f}s",
+                    scope=scope, user_id=user.id)
+        if update.callback_query or rate_limiter.should_notify(user.id, retry_after):
+            await notify_throttled(update, scope, retry_after)
+
+    return wrapper
+
+
+def add_timed_handler(handler):
+    """Register a handler with its callback rate limited, given shared user_data and wrapped in timed_handler."""
+    name = getattr(handler.callback, "__name__", "")
+    handler.callback = timed_handler(shared_user_data(rate_limited(handler.callback, COMMAND_COSTS.get(name, 1))))
+    telegram_app.add_handler(handler)
+
+def get_http_client() -> httpx.AsyncClient:
+    """Shared pooled async HTTP client (TMDB, link checks)."""
+    global http_client
+    if http_client is None or http_client.is_closed:
+        http_client = httpx.AsyncClient(
+            timeout=10,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+        )
+    return http_client
+
+
+def tmdb_headers() -> dict:
+    return {
+        "Authorization": f"Bearer {TMDB_TOKEN}",
+        "Accept": "application/json",
+    }
+
 def clean_firebase_key(key: str) -> str:
     """Sanitize Firebase keys by replacing disallowed characters."""
     return re.sub(r'[.#$/\[\]]', '_', key)
@@ -135,7 +2001,7 @@ def _linkpay_shorten_url_sync(link: str) -> str:
         "url": link
     }
 
-    logging.info(f"LinkPay shortener called: {url} | params={params}")
+    logging.debug(f"LinkPay shortener called for {link}")
 
     try:
         resp = requests.get(url, params=params, timeout=10)
@@ -143,7 +2009,7 @@ def _linkpay_shorten_url_sync(link: str) -> str:
 
         try:
             data = resp.json()
-            logging.info(f"LinkPay response: {data}")
+            logging.debug(f"LinkPay response: {data}")
 
             # LinkPay success response examples may be:
             # {"status":"success","shortenedUrl":"https://linkpays.in/xxxxx"}
@@ -170,14 +2036,43 @@ async def linkpay_shorten_link(link: str) -> str:
     return await asyncio.to_thread(_linkpay_shorten_url_sync, link)
 
 def get_movies():
-    return ref.get() or {}
+    """Cached catalog — treat as read-only, write through `storage`."""
+    return catalog.get()
+
+def get_title_lookup() -> dict:
+    """Lowercased title -> catalog key, rebuilt only after a full catalog reload."""
+    movies = catalog.get()
+    if title_lookup["loads"] != catalog.loads:
+        index = {}
+        for title in movies:
+            index.setdefault(title.strip().lower(), title)
+        title_lookup["index"] = index
+        title_lookup["loads"] = catalog.loads
+    return title_lookup["index"]
+
+
+def update_title_lookup(key, old, new):
+    if title_lookup["loads"] != catalog.loads:
+        return
+    index = title_lookup["index"]
+    lowered = key.strip().lower()
+    if new is None and index.get(lowered) == key:
+        # another title may differ only in case; it takes over the entry
+        other = next((title for title in catalog.data or {} if title.strip().lower() == lowered), None)
+        if other is None:
+            del index[lowered]
+        else:
+            index[lowered] = other
+    elif old is None and new is not None:
+        index.setdefault(lowered, key)
 
-def find_existing_title_case_insensitive(new_title: str, all_movies: dict) -> str | None:
-    new_title_normalized = new_title.strip().lower()
-    for existing_title in all_movies.keys():
-        if existing_title.strip().lower() == new_title_normalized:
-            return existing_title  # Return the actual Firebase key
-    return None
+
+catalog.subscribers.append(update_title_lookup)
+
+
+def find_existing_title_case_insensitive(new_title: str) -> str | None:
+    """Catalog key matching `new_title` ignoring case and outer whitespace."""
+    return get_title_lookup().get(new_title.strip().lower())
 
 
 async def delete_last(user_id, context):
@@ -226,37 +2121,23 @@ def safe_callback_data(prefix: str, identifier: str) -> str:
 async def handle_title_or_search(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     ensure_user_saved(update, context)
-    
-    # 🛡️ Rate-limit to avoid flood
-    now = time.time()
-    if user_id in last_user_message_time:
-        elapsed = now - last_user_message_time[user_id]
-        if elapsed < 2:
-            return
-    last_user_message_time[user_id] = now
 
     # ✏️ Handle report reason input
     if user_id in pending_reports:
-        title = pending_reports.pop(user_id)
-        reason = update.message.text.strip()
+        pending = pending_reports.pop(user_id)
         if not update.message or not update.message.text:
            return
+        reason = update.message.text.strip()
 
         if not reason or len(reason) < 3:
             await update.message.reply_text("⚠️ Report reason too short. Report canceled.")
             return
 
-        user_reported_movies.setdefault(user_id, set()).add(title)
-        await update.message.reply_text("✅ Thanks! Your report has been sent to the admin.")
+        if not record_report(pending["title"], pending.get("quality") or "all", user_id, reason):
+            return await update.message.reply_text("⚠️ You've already reported this movie.")
 
-        try:
-            await context.bot.send_message(
-                chat_id=ADMIN_ID,
-                text=f"⚠️ *New Broken Link Report*\n🎬 *{title.replace('_',' ')}*\n👤 User: `{user_id}`\n📝 Reason: _{reason}_",
-                parse_mode="Markdown"
-           )
-        except Exception as e:
-            logging.warning(f"❌ Failed to notify admin: {e}")
+        # the admin gets these in the periodic digest, not one message per report
+        await update.message.reply_text("✅ Thanks! Your report has been sent to the admin.")
         return
 
     # ✏️ Handle title rename
@@ -276,15 +2157,17 @@ async def handle_title_or_search(update: Update, context: ContextTypes.DEFAULT_T
         user = update.effective_user
         request_key = f"{user.username or user.id}_{timestamp}"
 
-        db.reference("Requests").child(request_key).set({
+        user_info = {
+            "id": user.id,
+            "username": user.username,
+            "first_name": user.first_name,
+        }
+        storage.add_request(request_key, {
             "title": movie_title,
-            "user": {
-                "id": user.id,
-                "username": user.username,
-                "first_name": user.first_name,
-            },
+            "user": user_info,
             "timestamp": timestamp
         })
+        record_request(movie_title, user_info, int(time.time()))
 
         await update.message.reply_text("✅ Your movie request has been sent to the admin. Thanks!")
         return
@@ -296,318 +2179,1056 @@ async def handle_title_or_search(update: Update, context: ContextTypes.DEFAULT_T
         if not url.startswith("http"):
             return await update.message.reply_text("❌ Invalid URL. Try again.")
 
-        ref.child(clean_firebase_key(title)).child("meta").update({"poster": url})
+        storage.update_meta(clean_firebase_key(title), {"poster": url})
         return await update.message.reply_text("✅ Poster updated successfully!")
 
-    # 🔍 Fallback to movie search
-    await delete_last(user_id, context)
-    return await search_movie(update, context)
+    # 🔍 Fallback to movie search
+    await delete_last(user_id, context)
+    return await search_movie(update, context)
+
+
+
+
+
+
+async def send_temp_log(context, chat_id, text, priority=SendScheduler.INTERACTIVE):
+    """Send a message that deletes itself after TEMP_MESSAGE_SECONDS."""
+    try:
+        msg = await outbox.send(context.bot, chat_id, text, priority=priority)
+    except Exception as e:
+        logging.warning(f"Send failed: {e}")
+        return
+    deletions.schedule(context.bot, chat_id, msg.message_id)
+
+async def request_movie(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user = update.effective_user
+    user_id = user.id
+
+    # ⏳ Anti-spam: 5 min cooldown
+    now = time.time()
+    if user_id in movie_requests and now - movie_requests[user_id] < 300:
+        return await update.message.reply_text("⏳ Please wait before sending another request.")
+
+    movie_requests[user_id] = now
+    context.user_data["awaiting_movie_request"] = True
+
+    await update.message.reply_text("🎬 Please type the name of the movie you want to request:")    
+
+def clean_firebase_key(name: str):
+    name = name.strip()
+    name = name.replace("’", "'")
+    name = name.replace("“", '"').replace("”", '"')
+    name = name.replace("…", "...")
+    name = " ".join(name.split())  # remove extra spaces
+    return name
+
+
+
+async def broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # Admin check
+    if update.effective_user.id != ADMIN_ID:
+        return await update.message.reply_text("⛔ Not authorized.")
+
+    if not context.args:
+        return await update.message.reply_text(
+            "Usage:\n/broadcast Your message here"
+        )
+
+    message = " ".join(context.args)
+
+    users = storage.all_user_ids()
+    if not users:
+        return await update.message.reply_text("❌ No users found.")
+
+    status = await update.message.reply_text(f"📤 Broadcasting message to {len(users)} users...")
+    spawn(run_broadcast(context.bot, status, users, message))
+
+
+async def run_broadcast(bot, status, users, message):
+    """Queue the broadcast at the lowest priority so live replies keep flowing."""
+    futures = [
+        outbox.enqueue(
+            SendScheduler.BROADCAST, int(user_id),
+            functools.partial(bot.send_message, chat_id=int(user_id), text=message),
+        )
+        for user_id in users
+    ]
+    results = await asyncio.gather(*futures, return_exceptions=True)
+    failed = sum(1 for r in results if isinstance(r, Exception))
+    sent = len(results) - failed
+
+    await status.edit_text(
+        f"✅ Broadcast completed!\n\n"
+        f"📨 Sent: {sent}\n"
+        f"❌ Failed: {failed}"
+    )
+
+
+
+
+
+
+
+
+
+
+
+async def upload_bulk(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Admin only: queue a .txt of `Title Quality Link` lines as a background upload job."""
+    if update.effective_user.id != ADMIN_ID:
+        logger.warning("UNAUTHORIZED USER ATTEMPTED /uploadbulk")
+        return await update.message.reply_text("⛔ Not authorized.")
+
+    doc = update.message.document
+    if not doc or not doc.file_name.lower().endswith('.txt'):
+        logger.warning("INVALID FILE SENT (not .txt)")
+        return await update.message.reply_text(
+            "⚠️ Please send a valid .txt file after /uploadbulk."
+        )
+
+    file_obj = await doc.get_file()
+    content = await file_obj.download_as_bytearray()
+    lines = upload_lines(content)
+
+    job_id = f"{time.time_ns() // 1_000_000}"
+    job = {
+        "status": "queued",
+        "file_id": doc.file_id,
+        "file_name": doc.file_name,
+        "chat_id": update.effective_chat.id,
+        "total": len(lines),
+        "line": 0,
+        "uploaded": 0,
+        "exists": 0,
+        "failed": 0,
+        "invalid": 0,
+        "created_at": int(time.time()),
+    }
+    storage.set_doc(UPLOAD_JOBS, job_id, job)
+    upload_files[job_id] = lines
+    ahead = len(pending_upload_jobs()) - 1
+    logger.info(f"UPLOAD QUEUED | {job_id} | TOTAL LINES = {len(lines)} | AHEAD = {ahead}")
+
+    start_upload_worker(context.bot)
+    await update.message.reply_text(
+        f"📄 Received `.txt` file with {len(lines)} lines.\n"
+        + (f"⏳ Queued as job `{job_id}` behind {ahead} upload(s)." if ahead
+           else f"⏳ Starting upload job `{job_id}`...")
+        + "\nUse /uploadstatus to follow it.",
+        parse_mode="Markdown"
+    )
+
+
+def upload_lines(content) -> list[str]:
+    return bytes(content).decode("utf-8", errors="ignore").strip().splitlines()
+
+
+def pending_upload_jobs() -> list[tuple[str, dict]]:
+    """Queued and running upload jobs, oldest first (finished jobs are never read)."""
+    jobs = {}
+    for status in ("queued", "running"):
+        jobs.update(storage.docs_where(UPLOAD_JOBS, "status", status))
+    return sorted(jobs.items(), key=lambda item: (item[1].get("created_at", 0), item[0]))
+
+
+def start_upload_worker(bot) -> bool:
+    """Drain the queue in this worker; if another worker holds the lease, that one picks new jobs up."""
+    global upload_task
+    if upload_task is not None and not upload_task.done():
+        return False
+    if not hold_lease(UPLOAD_LEASE):
+        return False
+    upload_task = spawn(run_upload_jobs(bot))
+    return True
+
+
+async def run_upload_jobs(bot):
+    """Work through the upload queue one job at a time until it is empty."""
+    try:
+        while still_holds(UPLOAD_LEASE):
+            jobs = pending_upload_jobs()
+            if jobs:
+                await run_queued_upload(bot, *jobs[0])
+                continue
+            drop_lease(UPLOAD_LEASE)
+            # a job queued by a worker that found the lease taken is ours to run
+            if not pending_upload_jobs() or not hold_lease(UPLOAD_LEASE):
+                return
+    finally:
+        drop_lease(UPLOAD_LEASE)
+
+
+async def run_queued_upload(bot, job_id: str, job: dict):
+    try:
+        await run_upload_job(bot, job_id, job)
+    except Exception as e:
+        logger.exception(f"UNEXPECTED ERROR DURING UPLOAD {job_id}")
+        storage.update_doc(UPLOAD_JOBS, job_id, {
+            "status": "failed", "error": repr(e), "finished_at": int(time.time()),
+        })
+        outbox.end_progress(job.get("chat_id"), f"upload:{job_id}")
+        try:
+            # exception text often holds _ * or `, which Telegram's Markdown parser rejects
+            await outbox.send(bot, job.get("chat_id", ADMIN_ID),
+                              f"❌ Upload job `{job_id}` failed: {escape_markdown(str(e))}",
+                              priority=SendScheduler.NOTIFY, parse_mode="Markdown")
+        except Exception as send_error:
+            logging.warning(f"Upload failure notice for {job_id} not sent: {send_error}")
+    finally:
+        upload_files.pop(job_id, None)
+        stop_requests.pop(job_id, None)
+
+
+async def run_upload_job(bot, job_id: str, job: dict):
+    """
+    Upload one job from `job["line"]` on. The checkpoint is written after every line
+    that shortened a link, so a restart never pays LinkPay twice for the same line.
+    """
+    lines = upload_files.get(job_id)
+    if lines is None:  # resumed after a restart: fetch the file again from Telegram
+        file_obj = await bot.get_file(job["file_id"])
+        lines = upload_lines(await file_obj.download_as_bytearray())
+
+    chat_id = job["chat_id"]
+    total_lines = len(lines)
+    resumed_from = job.get("line", 0)
+    now = int(time.time())
+    job.update(status="running", total=total_lines, updated_at=now, run_started_at=now, run_from_line=resumed_from)
+    job.setdefault("started_at", now)
+    storage.update_doc(UPLOAD_JOBS, job_id, {
+        "status": "running", "total": total_lines, "started_at": job["started_at"], "updated_at": now,
+        "run_started_at": now, "run_from_line": resumed_from, "worker": WORKER_ID,
+    })
+    logger.info(f"UPLOAD STARTED | {job_id} | TOTAL LINES = {total_lines} | FROM LINE = {resumed_from + 1}")
+
+    sampler = EventSampler()  # per-line events are sampled; the summary below has the totals
+    started = time.perf_counter()
+    progress_key = f"upload:{job_id}"
+    counters = ("line", "uploaded", "exists", "failed", "invalid")
+
+    def checkpoint(**extra):
+        job["updated_at"] = int(time.time())
+        storage.update_doc(UPLOAD_JOBS, job_id, {
+            **{name: job[name] for name in counters}, "updated_at": job["updated_at"], **extra,
+        })
+
+    for idx in range(resumed_from, total_lines):
+        if not still_holds(UPLOAD_LEASE):  # the job doc stays "running"; the new holder resumes it
+            outbox.end_progress(chat_id, progress_key)
+            return
+        if job_id in stop_requests:
+            job["status"] = "cancelled"
+            break
+
+        line = lines[idx].strip()
+        job["line"] = idx + 1
+        lineno = idx + 1
+        if not line:
+            continue
+
+        sampler.log(logging.DEBUG, "upload.line", f"LINE {lineno} | RAW: {line}", line=lineno)
+
+        parts = line.split()
+        if len(parts) >= 3 and parts[-2].endswith("p") and parts[-1].startswith("http"):
+            title = " ".join(parts[:-2])
+            quality = parts[-2]
+            link = parts[-1]
+        else:
+            job["invalid"] += 1
+            sampler.log(logging.WARNING, "upload.invalid", f"INVALID LINE {lineno} | {line}", line=lineno)
+            continue
+
+        existing_key = find_existing_title_case_insensitive(title)
+        safe_key = clean_firebase_key(existing_key if existing_key else title)
+        movie = get_movies().get(safe_key, {})
+
+        if quality in movie:
+            job["exists"] += 1
+            sampler.log(logging.INFO, "upload.exists", f"SKIPPED (EXISTS) | {safe_key} | {quality}",
+                        line=lineno, title=safe_key, quality=quality)
+        else:
+            try:
+                short_url = await asyncio.to_thread(_linkpay_shorten_url_sync, link)
+                fields = {quality: short_url}
+
+                # Ensure date_added exists (same write as the link)
+                if "date_added" not in (movie.get("meta") or {}):
+                    fields["meta/date_added"] = int(time.time())
+
+                storage.update_movie(safe_key, fields)
+
+                job["uploaded"] += 1
+                checkpoint(**{f"titles/{report_key(safe_key)}": safe_key})
+                sampler.log(logging.INFO, "upload.uploaded", f"UPLOADED | {safe_key} | {quality}",
+                            line=lineno, title=safe_key, quality=quality)
+            except Exception as e:
+                job["failed"] += 1
+                checkpoint()
+                logger.error(
+                    f"FAILED LINE {lineno} | {safe_key} | {quality} | ERROR: {repr(e)}"
+                )
+                continue
+
+        # Progress: one status message, edited as the outbox gets to it
+        if lineno % 10 == 0 or lineno == total_lines:
+            checkpoint()
+            sampler.log(logging.INFO, "upload.progress", f"PROGRESS {lineno}/{total_lines}",
+                        line=lineno, total=total_lines)
+            outbox.progress(
+                bot, chat_id, progress_key,
+                f"⏳ Processing movies: `{lineno}/{total_lines}`",
+                parse_mode="Markdown"
+            )
+
+    if job["status"] != "cancelled":
+        job["status"] = "done"
+    job["finished_at"] = int(time.time())
+    checkpoint(status=job["status"], finished_at=job["finished_at"])
+    outbox.end_progress(chat_id, progress_key)
+
+    logger.info(
+        f"UPLOAD {job['status'].upper()} | {job_id} | Total={total_lines} | "
+        f"Success={job['uploaded']} | Exists={job['exists']} | "
+        f"Failed={job['failed']} | Invalid={job['invalid']}",
+        extra={"event": "upload.finished", "fields": {
+            "job": job_id, "status": job["status"], "total": total_lines,
+            "uploaded": job["uploaded"], "exists": job["exists"],
+            "failed": job["failed"], "invalid": job["invalid"], "resumed_from": resumed_from,
+            "seconds": round(time.perf_counter() - started, 3), "sampled": sampler.counts(),
+        }}
+    )
+
+    titles = set(((storage.get_doc(UPLOAD_JOBS, job_id) or {}).get("titles") or {}).values())
+    fulfilled = await fulfil_requests(bot, titles)
+
+    summary = (
+        (f"🛑 *Upload Cancelled* at line {job['line']}\n" if job["status"] == "cancelled"
+         else f"✅ *Upload Complete!*\n")
+        + f"• Total: {total_lines}\n"
+        f"• Uploaded: {job['uploaded']}\n"
+        f"• Already Exists: {job['exists']}\n"
+        f"• Failed: {job['failed']}\n"
+        f"• Invalid Lines: {job['invalid']}\n"
+        f"• Requests Fulfilled: {fulfilled}"
+    )
+    await outbox.send(bot, chat_id, summary, priority=SendScheduler.NOTIFY, parse_mode="Markdown")
+
+
+def describe_upload_job(job_id: str, job: dict) -> str:
+    done, total = job.get("line", 0), job.get("total", 0)
+    text = (
+        f"📦 `{job_id}` {escape_markdown(job.get('file_name', ''))} — {job.get('status')}, {done}/{total} lines\n"
+        f"   ✅ {job.get('uploaded', 0)} uploaded, ♻️ {job.get('exists', 0)} existing, "
+        f"❌ {job.get('failed', 0)} failed, ⚠️ {job.get('invalid', 0)} invalid"
+    )
+    if job.get("status") == "running" and job.get("run_started_at"):
+        # from the persisted checkpoint, so any worker can answer
+        elapsed = job.get("updated_at", 0) - job["run_started_at"]
+        rate = (done - job.get("run_from_line", 0)) / elapsed if elapsed > 0 else 0
+        eta = f"{(total - done) / rate:.0f}s" if rate > 0 else "?"
+        text += f"\n   🚀 {rate:.1f} lines/s, ETA {eta}"
+    return text
+
+
+async def upload_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Admin only: /uploadstatus — the running upload with throughput and ETA, plus the queue."""
+    if update.effective_user.id != ADMIN_ID:
+        return await update.message.reply_text("⛔ Not authorized.")
+
+    jobs = pending_upload_jobs()
+    if not jobs:
+        return await update.message.reply_text("ℹ️ No uploads queued or running.")
+    await update.message.reply_text(
+        "\n".join(describe_upload_job(job_id, job) for job_id, job in jobs),
+        parse_mode="Markdown"
+    )
+
+
+async def upload_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Admin only: /uploadcancel [job_id] — stop the running upload, or drop a queued one."""
+    if update.effective_user.id != ADMIN_ID:
+        return await update.message.reply_text("⛔ Not authorized.")
+
+    jobs = dict(pending_upload_jobs())
+    if not jobs:
+        return await update.message.reply_text("ℹ️ No uploads queued or running.")
+    job_id = context.args[0] if context.args else next(iter(jobs))
+    job = jobs.get(job_id)
+    if job is None:
+        return await update.message.reply_text(f"⚠️ No pending upload `{job_id}`.", parse_mode="Markdown")
+
+    if job.get("status") == "running" and state.owner(UPLOAD_LEASE) is not None:
+        stop_requests[job_id] = True  # whichever worker runs it stops after the line it is on
+        return await update.message.reply_text(f"🛑 Stopping upload `{job_id}`…", parse_mode="Markdown")
+
+    storage.update_doc(UPLOAD_JOBS, job_id, {"status": "cancelled", "finished_at": int(time.time())})
+    upload_files.pop(job_id, None)
+    await update.message.reply_text(f"🛑 Upload `{job_id}` cancelled.", parse_mode="Markdown")
+
+
+async def resume_uploads():
+    """Restart the upload worker if jobs were queued or running when the process stopped."""
+    jobs = pending_upload_jobs()
+    if jobs:
+        logging.info(f"📦 Resuming {len(jobs)} upload job(s), first from line {jobs[0][1].get('line', 0) + 1}")
+        start_upload_worker(telegram_app.bot)
+
+
+
+
+async def add_movie(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id != ADMIN_ID:
+        return await update.message.reply_text("⛔ Not authorized.")
+
+    text = update.message.text.replace("/addmovie", "").strip()
+    lines = text.split("\n")
+
+    # Detect input format
+    if len(lines) == 2:
+        title_quality_line, link = lines
+    else:
+        parts = text.split()
+        if len(parts) < 3:
+            return await send_temp_log(context, update.effective_chat.id,
+                "❌ Invalid format.\nUse:\nTitle  Quality  Link\nor\nTitle  Quality\nLink")
+        title_quality_line = " ".join(parts[:-1])
+        link = parts[-1]
+
+    match = re.match(r"(.+?)\s{2,}(\d{3,4}p)", title_quality_line)
+    if not match:
+        return await send_temp_log(context, update.effective_chat.id,
+            "❌ Couldn't parse title and quality. Use double space between them.")
+
+    title, quality = match.groups()
+    safe_key = clean_firebase_key(title)
+    movie = storage.get_movie(safe_key) or {}
+
+    if quality in movie:
+        return await send_temp_log(context, update.effective_chat.id,
+            f"⚠️ Skipped: {title}  {quality} already exists")
+
+    try:
+        short_url = await asyncio.to_thread(_linkpay_shorten_url_sync, link)
+        storage.update_movie(safe_key, {quality: short_url})
+    except Exception as e:
+        return await send_temp_log(context, update.effective_chat.id,
+            f"❌ Failed: {title}  {quality} — error shortening or saving link")
 
+    try:
+        await fulfil_requests(context.bot, [safe_key])
+    except Exception as e:
+        # the link is saved; a failed notification must not report the add as failed
+        logging.warning(f"Fulfilling requests for {safe_key} failed: {e}")
+    return await send_temp_log(context, update.effective_chat.id,
+        f"✅ Added: {title}  {quality}  {short_url}")
 
 
 
 
 
-async def send_temp_log(context, chat_id, text):
-    msg = await context.bot.send_message(chat_id=chat_id, text=text)
 
-    async def delete_later():
-        await asyncio.sleep(10)
-        try:
-            await context.bot.delete_message(chat_id=chat_id, message_id=msg.message_id)
-        except:
-            pass
 
-    asyncio.create_task(delete_later())
+def request_summary_key(title: str) -> str:
+    """Firebase-safe key shared by every request for the same normalized title."""
+    return re.sub(r'[.#$/\[\]]', '_', normalize_title(title))[:200] or "_"
 
 
-# ✅ Properly placed helper (not nested!)
-async def send_temp_log_rate_limited(context, chat_id, text, delay=1):
-    """Rate-limited log sender to avoid Telegram flood errors."""
-    try:
-        msg = await context.bot.send_message(chat_id=chat_id, text=text)
-        await asyncio.sleep(delay)  # delay between messages
-        asyncio.create_task(delete_after_delay(context, chat_id, msg.message_id))
-    except Exception as e:
-        logging.warning(f"Send failed: {e}")
+def requester_name(user_info: dict) -> str:
+    if user_info.get("username"):
+        return f"@{user_info['username']}"
+    return user_info.get("first_name") or str(user_info.get("id"))
 
 
-async def delete_after_delay(context, chat_id, message_id, delay=10):
-    """Deletes a message after delay."""
-    await asyncio.sleep(delay)
+def add_to_summary(summary: dict | None, title: str, user_info: dict, ts: int) -> dict:
+    summary = summary or {
+        "title": title,
+        "count": 0,
+        "requesters": {},
+        "first_requested": ts,
+        "last_requested": ts,
+        "status": "open",
+    }
+    if summary.get("status") != "open":  # asked again after being closed
+        summary.update({"status": "open", "count": 0, "requesters": {}, "first_requested": ts})
+    summary["count"] = summary.get("count", 0) + 1
+    summary.setdefault("requesters", {})[str(user_info.get("id"))] = requester_name(user_info)
+    summary["first_requested"] = min(summary.get("first_requested") or ts, ts)
+    summary["last_requested"] = max(summary.get("last_requested") or ts, ts)
+    return summary
+
+
+def record_request(title: str, user_info: dict, ts: int):
+    """Fold one /requestmovie into its per-title summary."""
+    key = request_summary_key(title)
     try:
-        await context.bot.delete_message(chat_id=chat_id, message_id=message_id)
+        storage.save_request_summary(key, add_to_summary(storage.get_request_summary(key), title, user_info, ts))
     except Exception as e:
-        logging.warning(f"Delete failed: {e}")
+        logging.warning(f"Failed to update request summary for {title}: {e}")
 
-async def request_movie(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user = update.effective_user
-    user_id = user.id
 
-    # ⏳ Anti-spam: 5 min cooldown
-    now = time.time()
-    if user_id in movie_requests and now - movie_requests[user_id] < 300:
-        return await update.message.reply_text("⏳ Please wait before sending another request.")
+def rebuild_request_summaries() -> int:
+    """Backfill RequestSummary from the raw Requests log for titles that have no summary yet."""
+    existing = storage.request_summaries()
+    summaries = {}
+    for info in storage.all_requests().values():
+        title = (info or {}).get("title")
+        if not title:
+            continue
+        try:
+            ts = int(datetime.strptime(info.get("timestamp", ""), "%Y-%m-%d_%H-%M-%S").timestamp())
+        except ValueError:
+            ts = int(time.time())
+        key = request_summary_key(title)
+        if key in existing:
+            continue
+        summaries[key] = add_to_summary(summaries.get(key), title, info.get("user") or {}, ts)
 
-    movie_requests[user_id] = now
-    context.user_data["awaiting_movie_request"] = True
+    for key, summary in summaries.items():
+        storage.save_request_summary(key, summary)
+    storage.set_doc("Jobs", "requests_backfilled", {"at": int(time.time()), "titles": len(summaries)})
+    return len(summaries)
 
-    await update.message.reply_text("🎬 Please type the name of the movie you want to request:")    
 
-def clean_firebase_key(name: str):
-    name = name.strip()
-    name = name.replace("’", "'")
-    name = name.replace("“", '"').replace("”", '"')
-    name = name.replace("…", "...")
-    name = " ".join(name.split())  # remove extra spaces
-    return name
+def build_requests_page(page: int):
+    """Open requests, most requested first, as a MarkdownV2 page + nav keyboard."""
+    summaries = [s for s in storage.request_summaries().values() if s.get("status") == "open"]
+    summaries.sort(key=lambda s: (-s.get("count", 0), -s.get("last_requested", 0)))
 
+    pages = max(1, -(-len(summaries) // REQUESTS_PER_PAGE))
+    page = max(0, min(page, pages - 1))
+    start = page * REQUESTS_PER_PAGE
 
+    reply_lines = []
+    for summary in summaries[start:start + REQUESTS_PER_PAGE]:
+        title = escape_markdown(summary.get("title", "Unknown"), version=2)
+        names = list((summary.get("requesters") or {}).values())
+        who = ", ".join(names[:3]) + (f" +{len(names) - 3} more" if len(names) > 3 else "")
+        first = datetime.fromtimestamp(summary.get("first_requested", 0)).strftime("%Y-%m-%d")
+        last = datetime.fromtimestamp(summary.get("last_requested", 0)).strftime("%Y-%m-%d")
+        reply_lines.append(
+            f"• *{title}* — {summary.get('count', 0)}×\n"
+            f"   👤 {escape_markdown(who, version=2)}\n"
+            f"   🕒 {escape_markdown(first, version=2)} → {escape_markdown(last, version=2)}"
+        )
 
-async def broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    # Admin check
-    if update.effective_user.id != ADMIN_ID:
-        return await update.message.reply_text("⛔ Not authorized.")
+    text = (
+        f"*📂 Movie Requests* \\({len(summaries)} titles, page {page + 1}/{pages}\\)\n\n"
+        + "\n".join(reply_lines)
+    )
 
-    if not context.args:
-        return await update.message.reply_text(
-            "Usage:\n/broadcast Your message here"
-        )
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton("⬅ Prev", callback_data=f"rq|{page - 1}"))
+    if page < pages - 1:
+        nav.append(InlineKeyboardButton("➡ Next", callback_data=f"rq|{page + 1}"))
 
-    message = " ".join(context.args)
+    return len(summaries), text, InlineKeyboardMarkup([nav] if nav else [])
 
-    users = db.reference("Users").get()
-    if not users:
-        return await update.message.reply_text("❌ No users found.")
 
-    sent = 0
-    failed = 0
+def request_match_name(title: str) -> str:
+    """Normalized title without year/punctuation, for matching uploads to requests."""
+    name = normalize_title(title)
+    name = re.sub(r"[(\[]?\b(19|20)\d{2}\b[)\]]?", " ", name)
+    name = re.sub(r"[^\w\s]", " ", name)
+    return " ".join(name.split())
 
-    status = await update.message.reply_text("📤 Broadcasting message...")
 
-    for user_id in users.keys():
-        try:
-            await context.bot.send_message(
-                chat_id=int(user_id),
-                text=message
+def match_requests(titles) -> dict:
+    """
+    Match catalog titles against open requests in one pass.
+    Exact normalized names first, then a trigram fuzzy match; numbers must agree
+    so "Iron Man 2" never fulfils "Iron Man 3".
+    Returns request key -> (title, summary).
+    """
+    open_requests = {
+        key: summary for key, summary in storage.request_summaries().items()
+        if summary.get("status") == "open" and summary.get("title")
+    }
+    if not open_requests:
+        return {}
+
+    names = {key: request_match_name(summary["title"]) for key, summary in open_requests.items()}
+    by_name = defaultdict(list)
+    for key, name in names.items():
+        by_name[name].append(key)
+    matcher = FuzzyMatcher(names, candidates=50)
+
+    matched = {}
+    for title in titles:
+        name = request_match_name(title)
+        hits = by_name.get(name) or [
+            key for key in matcher.match(name, n=3, cutoff=REQUEST_MATCH_CUTOFF)
+            if re.findall(r"\d+", names[key]) == re.findall(r"\d+", name)
+        ]
+        for key in hits:
+            matched.setdefault(key, (title, open_requests[key]))
+    return matched
+
+
+async def fulfil_requests(bot, titles) -> int:
+    """Close open requests matched by newly added titles and notify the requesters."""
+    try:
+        matched = match_requests(titles)
+    except Exception as e:
+        logging.warning(f"Request matching failed: {e}")
+        return 0
+
+    now = int(time.time())
+    notified = 0
+    for key, (title, summary) in matched.items():
+        summary.update({"status": "fulfilled", "fulfilled_title": title, "fulfilled_at": now})
+        storage.save_request_summary(key, summary)
+
+        text = f"🎉 Your requested movie is now available: {title.replace('_', ' ')}"
+        markup = InlineKeyboardMarkup([[
+            InlineKeyboardButton("🎬 Open", callback_data=movie_callback_data(title))
+        ]])
+        for user_id in (summary.get("requesters") or {}):
+            outbox.enqueue(
+                SendScheduler.NOTIFY, int(user_id),
+                functools.partial(bot.send_message, chat_id=int(user_id), text=text, reply_markup=markup),
+                future=False,
             )
-            sent += 1
-        except Exception:
-            failed += 1
+            notified += 1
 
-    await status.edit_text(
-        f"✅ Broadcast completed!\n\n"
-        f"📨 Sent: {sent}\n"
-        f"❌ Failed: {failed}"
-    )
+    if matched:
+        logging.info(f"Fulfilled {len(matched)} requests, notifying {notified} users")
+    return len(matched)
 
 
+def report_key(title: str) -> str:
+    return re.sub(r'[.#$/\[\]]', '_', title)[:200] or "_"
 
 
+def resolve_report_title(title: str) -> str:
+    """Report callbacks carry a possibly-truncated title; map it back to the catalog key."""
+    movies = get_movies()
+    if title in movies:
+        return title
+    return next((key for key in movies if key.startswith(title)), title)
 
 
+def record_report(title: str, quality: str, user_id: int, reason: str) -> bool:
+    """
+    Add a broken-link report to the per-title counters. False if this user already reported it.
+    Runs as a storage transaction so simultaneous reports of one title all count.
+    """
+    now = int(time.time())
+    added = False
+
+    def update(report):
+        nonlocal added
+        report = report or {
+            "title": title,
+            "count": 0,
+            "digested_count": 0,
+            "qualities": {},
+            "users": {},
+            "reasons": [],
+            "first_reported": now,
+        }
+        users = report.get("users") or {}
+        added = str(user_id) not in users
+        if not added:
+            return report
+
+        users[str(user_id)] = now
+        if len(users) > REPORT_USERS_KEPT:
+            users = dict(sorted(users.items(), key=lambda item: item[1])[-REPORT_USERS_KEPT:])
+        report["users"] = users
+        report["count"] = report.get("count", 0) + 1
+        qualities = report.get("qualities") or {}
+        quality_key = report_key(quality)
+        qualities[quality_key] = qualities.get(quality_key, 0) + 1
+        report["qualities"] = qualities
+        report["reasons"] = (report.get("reasons") or [])[-(REPORT_REASONS_KEPT - 1):] + [reason[:200]]
+        report["last_reported"] = now
+        return report
+
+    storage.update_report(report_key(title), update)
+    return added
+
+
+def format_report_lines(reports: list[dict], new_only: bool) -> list[str]:
+    lines = []
+    for report in reports:
+        count = report.get("count", 0)
+        new = count - report.get("digested_count", 0)
+        qualities = ", ".join(f"{q}×{n}" for q, n in sorted((report.get("qualities") or {}).items()))
+        reasons = "; ".join(report.get("reasons") or [])[:120]
+        lines.append(
+            f"• {report.get('title', '?').replace('_', ' ')} — {count} reports"
+            + (f" (+{new} new)" if new_only and new else "")
+            + (f"\n   🔗 {qualities}" if qualities else "")
+            + (f"\n   📝 {reasons}" if reasons else "")
+        )
+    return lines
 
 
+async def send_report_digest(bot) -> int:
+    """Send the admin one message with the titles that got new reports since the last digest."""
+    reports = storage.all_reports()
+    fresh = [
+        (key, r) for key, r in reports.items()
+        if r.get("count", 0) > r.get("digested_count", 0)
+    ]
+    if not fresh:
+        return 0
 
+    fresh.sort(key=lambda item: -(item[1].get("count", 0) - item[1].get("digested_count", 0)))
+    new_total = sum(r.get("count", 0) - r.get("digested_count", 0) for _, r in fresh)
 
+    text = (
+        f"⚠️ Broken link digest: {new_total} new reports on {len(fresh)} titles\n\n"
+        + "\n".join(format_report_lines([r for _, r in fresh[:REPORT_DIGEST_TOP]], new_only=True))
+    )
+    if len(fresh) > REPORT_DIGEST_TOP:
+        text += f"\n\n…and {len(fresh) - REPORT_DIGEST_TOP} more. Use /reports for the full list."
 
-async def upload_bulk(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if update.effective_user.id != ADMIN_ID:
-        logger.warning("UNAUTHORIZED USER ATTEMPTED /uploadbulk")
-        return await update.message.reply_text("⛔ Not authorized.")
+    await outbox.send(bot, ADMIN_ID, text[:4000], priority=SendScheduler.NOTIFY)
 
-    if context.bot_data.get("upload_running", False):
-        logger.warning("UPLOAD ALREADY RUNNING")
-        return await update.message.reply_text("⚠️ Upload already in progress. Try again later.")
-    context.bot_data["upload_running"] = True
+    for key, report in fresh:
+        storage.update_doc("Reports", key, {"digested_count": report.get("count", 0)})
+    return len(fresh)
 
-    try:
-        doc = update.message.document
-        if not doc or not doc.file_name.lower().endswith('.txt'):
-            logger.warning("INVALID FILE SENT (not .txt)")
-            return await update.message.reply_text(
-                "⚠️ Please send a valid .txt file after /uploadbulk."
-            )
 
-        file_obj = await doc.get_file()
-        content = await file_obj.download_as_bytearray()
-        text = content.decode("utf-8", errors="ignore")
+async def snapshot_loop():
+    """Background task: refresh the catalog snapshot and drop tombstones no snapshot can need."""
+    while True:
+        await asyncio.sleep(SNAPSHOT_INTERVAL)
+        if not is_leader():
+            continue
+        try:
+            if await catalog.save_snapshot():
+                logging.info(f"Catalog snapshot saved ({len(catalog.data)} titles)")
+            storage.prune_deleted(int(time.time()) - SNAPSHOT_MAX_AGE)
+        except Exception as e:
+            logging.warning(f"Catalog snapshot failed: {e}")
 
-        lines = text.strip().splitlines()
-        total_lines = len(lines)
 
-        logger.info(f"UPLOAD STARTED | TOTAL LINES = {total_lines}")
+async def catalog_watch_loop():
+    """Background task: follow writes made by other instances through the store's catalog_version."""
+    while True:
+        await asyncio.sleep(CATALOG_VERSION_SECONDS)
+        try:
+            await catalog.sync_remote()
+        except Exception as e:
+            logging.warning(f"Catalog version check failed: {e}")
 
-        await update.message.reply_text(
-            f"📄 Received `.txt` file with {total_lines} lines.\n⏳ Starting upload...",
-            parse_mode="Markdown"
-        )
 
-        # Load existing movies once
-        movies = get_movies()
+async def report_digest_loop():
+    """Background task: send the report digest every REPORT_DIGEST_MINUTES."""
+    while True:
+        await asyncio.sleep(REPORT_DIGEST_MINUTES * 60)
+        if not is_leader():
+            continue
+        try:
+            await send_report_digest(telegram_app.bot)
+        except Exception as e:
+            logging.warning(f"Report digest failed: {e}")
 
-        success_count = 0
-        exists_count = 0
-        failed_count = 0
-        invalid_count = 0
 
-        for idx, line in enumerate(lines, start=1):
-            line = line.strip()
+async def view_reports(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Admin only: /reports — most-reported titles; /reports clear Title (or all) after fixing links."""
+    if update.effective_user.id != ADMIN_ID:
+        return await update.message.reply_text("⛔ Not authorized.")
 
-            if not line:
-                continue
+    if context.args and context.args[0].lower() == "clear":
+        target = " ".join(context.args[1:]).strip()
+        if not target or target.lower() == "all":
+            for key in storage.all_reports():
+                storage.delete_report(key)
+            return await update.message.reply_text("🧹 All reports cleared.")
+        storage.delete_report(report_key(resolve_report_title(target)))
+        return await update.message.reply_text(f"🧹 Reports cleared for {target}.")
 
-            logger.info(f"LINE {idx} | RAW: {line}")
+    reports = sorted(storage.all_reports().values(), key=lambda r: -r.get("count", 0))
+    if not reports:
+        return await update.message.reply_text("✅ No broken link reports.")
 
-            parts = line.split()
-            if len(parts) >= 3 and parts[-2].endswith("p") and parts[-1].startswith("http"):
-                title = " ".join(parts[:-2])
-                quality = parts[-2]
-                link = parts[-1]
-            else:
-                invalid_count += 1
-                logger.warning(f"INVALID LINE {idx} | {line}")
-                continue
+    text = (
+        f"⚠️ Broken link reports ({len(reports)} titles)\n\n"
+        + "\n".join(format_report_lines(reports[:REPORT_DIGEST_TOP], new_only=False))
+    )
+    await update.message.reply_text(text[:4000])
 
-            existing_key = find_existing_title_case_insensitive(title, movies)
-            safe_key = clean_firebase_key(existing_key if existing_key else title)
-            movie = movies.get(safe_key, {})
 
-            if quality in movie:
-                exists_count += 1
-                logger.info(f"SKIPPED (EXISTS) | {safe_key} | {quality}")
-                continue
+class HostRateLimiter:
+    """Spaces requests to the same host at most `rate` per second."""
 
-            try:
-                short_url = await asyncio.to_thread(_linkpay_shorten_url_sync, link)
-                ref.child(safe_key).update({quality: short_url})
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate > 0 else 0
+        self.next_slot = {}
 
-                # Ensure date_added exists
-                meta_ref = ref.child(safe_key).child("meta")
-                existing_meta = meta_ref.get() or {}
+    async def wait(self, host: str):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        slot = max(now, self.next_slot.get(host, 0))
+        self.next_slot[host] = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
 
-                if "date_added" not in existing_meta:
-                    meta_ref.update({"date_added": int(time.time())})
 
-                # 🔥 IMPORTANT: update in-memory cache to prevent false FAILED
-                movies.setdefault(safe_key, {})[quality] = short_url
+def link_fingerprint(url: str) -> int:
+    return zlib.crc32(url.encode("utf-8"))
 
-                success_count += 1
-                logger.info(f"UPLOADED | {safe_key} | {quality}")
 
-            except Exception as e:
-                failed_count += 1
-                logger.error(
-                    f"FAILED LINE {idx} | {safe_key} | {quality} | ERROR: {repr(e)}"
-                )
-                continue
+async def check_link(url: str, semaphore: asyncio.Semaphore, limiter: HostRateLimiter) -> dict:
+    """HEAD the url (falling back to a streamed GET) and return its health record."""
+    client = get_http_client()
+    try:
+        host = urlsplit(url).hostname or ""
+    except ValueError:  # e.g. a broken IPv6 literal; the request below records the error
+        host = ""
+    # wait for the host slot before taking a connection slot, so throttled hosts don't starve others
+    await limiter.wait(host)
+    async with semaphore:
+        start = time.perf_counter()
+        status, error = 0, None
+        try:
+            resp = await client.head(url, follow_redirects=True, timeout=LINK_CHECK_TIMEOUT)
+            status = resp.status_code
+            if status >= 400:
+                # plenty of file hosts reject HEAD; only the body-less GET is authoritative
+                async with client.stream("GET", url, follow_redirects=True, timeout=LINK_CHECK_TIMEOUT) as resp:
+                    status = resp.status_code
+        except (httpx.HTTPError, httpx.InvalidURL) as e:
+            error = type(e).__name__
+        except Exception as e:  # a malformed stored link must never abort the whole sweep
+            status, error = 0, type(e).__name__
+        return {
+            "status": status,
+            "ok": 200 <= status < 400,
+            "latency_ms": int((time.perf_counter() - start) * 1000),
+            "checked_at": int(time.time()),
+            "fp": link_fingerprint(url),
+            **({"error": error} if error else {}),
+        }
 
-            # Progress log
-            if idx % 10 == 0 or idx == total_lines:
-                logger.info(f"PROGRESS {idx}/{total_lines}")
-                await context.bot.send_message(
-                    chat_id=update.effective_chat.id,
-                    text=f"⏳ Processing movies: `{idx}/{total_lines}`",
-                    parse_mode="Markdown"
-                )
-                await asyncio.sleep(0.3)
 
-        logger.info(
-            f"UPLOAD FINISHED | Total={total_lines} | "
-            f"Success={success_count} | Exists={exists_count} | "
-            f"Failed={failed_count} | Invalid={invalid_count}"
-        )
+def movie_links(movie: dict):
+    """Yield (quality, url) for every http link of a title."""
+    for quality, url in movie.items():
+        if quality != "meta" and isinstance(url, str) and url.startswith(("http://", "https://")):
+            yield quality, url
 
-        summary = (
-            f"✅ *Upload Complete!*\n"
-            f"• Total: {total_lines}\n"
-            f"• Uploaded: {success_count}\n"
-            f"• Already Exists: {exists_count}\n"
-            f"• Failed: {failed_count}\n"
-            f"• Invalid Lines: {invalid_count}"
-        )
-        await context.bot.send_message(
-            chat_id=update.effective_chat.id,
-            text=summary,
-            parse_mode="Markdown"
-        )
 
-    except Exception as e:
-        logger.exception("UNEXPECTED ERROR DURING UPLOAD")
-        await update.message.reply_text("❌ Something went wrong during upload.")
+def cached_link_health(movie: dict, quality_key: str, url: str):
+    health = ((movie.get("meta") or {}).get("link_health") or {}).get(quality_key)
+    if (
+        health
+        and health.get("fp") == link_fingerprint(url)
+        and time.time() - health.get("checked_at", 0) < LINK_CHECK_MAX_AGE
+    ):
+        return health
+    return None
 
-    finally:
-        context.bot_data["upload_running"] = False
-        logger.info("UPLOAD FLAG RESET")
 
+async def run_link_check(bot=None, fresh: bool = False):
+    """
+    Walk every quality link in key order, LINK_CHECK_CHUNK titles at a time.
+    The Jobs doc holds the last finished key so an interrupted sweep picks up where it stopped.
+    """
+    job = storage.get_doc("Jobs", LINK_CHECK_JOB) or {}
+    if fresh or job.get("status") != "running":
+        job = {
+            "status": "running",
+            "started_at": int(time.time()),
+            "cursor": "",
+            "titles_done": 0,
+            "checked": 0,
+            "cached": 0,
+            "dead": 0,
+        }
+        storage.set_doc("Jobs", LINK_CHECK_JOB, job)
 
+    semaphore = asyncio.Semaphore(LINK_CHECK_CONCURRENCY)
+    limiter = HostRateLimiter(LINK_CHECK_HOST_RPS)
+    seen = {}  # url -> task, links shared between titles are fetched once per sweep
 
+    keys = sorted(get_movies())
+    job["total_titles"] = len(keys)
+    position = bisect.bisect_right(keys, job["cursor"]) if job["cursor"] else 0
 
-async def add_movie(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    def schedule(chunk):
+        movies = get_movies()
+        pending = []  # (path, key, quality, url, task)
+        for key in chunk:
+            movie = movies.get(key) or {}
+            for quality, url in movie_links(movie):
+                quality_key = report_key(quality)
+                if cached_link_health(movie, quality_key, url):
+                    job["cached"] += 1
+                    continue
+                if url not in seen:
+                    seen[url] = asyncio.ensure_future(check_link(url, semaphore, limiter))
+                pending.append((f"{key}/meta/link_health/{quality_key}", key, quality, url, seen[url]))
+        return pending
+
+    # a few chunks stay in flight so one slow host doesn't stall the sweep at every
+    # chunk boundary; checkpoints are still written strictly in key order
+    in_flight = deque()
+    try:
+        while position < len(keys) or in_flight:
+            if not still_holds(LINK_CHECK_LEASE):  # another worker resumes from the last checkpoint
+                return job
+            if stop_requests.pop(LINK_CHECK_JOB, None):  # /checklinks stop, possibly sent to another worker
+                job["status"] = "stopped"
+                storage.set_doc("Jobs", LINK_CHECK_JOB, job)
+                logging.info(f"🔗 Link check stopped after {job['cursor']!r}")
+                return job
+            while position < len(keys) and len(in_flight) < LINK_CHECK_WINDOW:
+                chunk = keys[position:position + LINK_CHECK_CHUNK]
+                in_flight.append((chunk, schedule(chunk)))
+                position += len(chunk)
+
+            chunk, pending = in_flight.popleft()
+            results = await asyncio.gather(*(entry[-1] for entry in pending))
+            # titles deleted, renamed or relinked while their checks ran: a meta-only
+            # write would bring a deleted key back as a title without links
+            movies = get_movies()
+            storage.update_paths({
+                path: result
+                for (path, key, quality, url, _), result in zip(pending, results)
+                if (movies.get(key) or {}).get(quality) == url
+            })
+
+            job["checked"] += len(results)
+            job["dead"] += sum(1 for r in results if not r["ok"])
+            job["titles_done"] = job.get("titles_done", 0) + len(chunk)
+            job["cursor"] = chunk[-1]
+            job["updated_at"] = int(time.time())
+            storage.set_doc("Jobs", LINK_CHECK_JOB, job)
+    finally:
+        for task in seen.values():
+            task.cancel()
+
+    job["status"] = "done"
+    job["finished_at"] = int(time.time())
+    storage.set_doc("Jobs", LINK_CHECK_JOB, job)
+    logging.info(f"🔗 Link check finished: {job['checked']} checked, {job['cached']} cached, {job['dead']} dead")
+
+    if bot is not None:
+        await send_dead_link_report(bot, job)
+    return job
+
+
+def build_dead_link_report() -> tuple[str, int]:
+    """Tab-separated list of every link whose last check failed."""
+    lines = []
+    for key, movie in sorted(get_movies().items()):
+        health = (movie.get("meta") or {}).get("link_health") or {}
+        for quality, url in movie_links(movie):
+            result = health.get(report_key(quality))
+            if result and not result.get("ok"):
+                reason = result.get("error") or result.get("status")
+                lines.append(f"{key}\t{quality}\t{reason}\t{url}")
+    return "\n".join(lines), len(lines)
+
+
+def link_check_status() -> str:
+    job = storage.get_doc("Jobs", LINK_CHECK_JOB) or {}
+    if not job:
+        return "never run"
+    return f"{job.get('status')}, {job.get('titles_done', 0)}/{job.get('total_titles', '?')} titles, {job.get('dead', 0)} dead"
+
+
+async def send_dead_link_report(bot, job: dict):
+    report, dead = build_dead_link_report()
+    elapsed = job.get("finished_at", int(time.time())) - job.get("started_at", int(time.time()))
+    summary = (
+        f"🔗 Link check done in {elapsed}s\n"
+        f"✅ Checked: {job.get('checked', 0)}\n"
+        f"♻️ Cached: {job.get('cached', 0)}\n"
+        f"❌ Dead: {dead}"
+    )
+    await outbox.send(bot, ADMIN_ID, summary, priority=SendScheduler.NOTIFY)
+    if dead:
+        await outbox.enqueue(SendScheduler.NOTIFY, ADMIN_ID, functools.partial(
+            bot.send_document,
+            chat_id=ADMIN_ID,
+            document=BytesIO(report.encode("utf-8")),
+            filename=f"dead_links_{int(time.time())}.tsv",
+        ))
+
+
+def start_link_check(bot, fresh: bool = False) -> bool:
+    """Start a sweep in this worker unless one is running here or in another worker."""
+    global link_check_task
+    if link_check_task is not None and not link_check_task.done():
+        return False
+    if not hold_lease(LINK_CHECK_LEASE):
+        return False
+    stop_requests.pop(LINK_CHECK_JOB, None)
+    link_check_task = spawn(run_link_check(bot, fresh=fresh))
+    link_check_task.add_done_callback(lambda _: drop_lease(LINK_CHECK_LEASE))
+    return True
+
+
+async def resume_link_check():
+    """Pick up a sweep that was running when the process stopped."""
+    job = storage.get_doc("Jobs", LINK_CHECK_JOB) or {}
+    if job.get("status") == "running":
+        logging.info(f"🔗 Resuming link check after {job.get('cursor')!r}")
+        start_link_check(telegram_app.bot)
+
+
+async def check_links(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Admin only: /checklinks [restart|status|stop] — sweep all quality links in the background."""
     if update.effective_user.id != ADMIN_ID:
         return await update.message.reply_text("⛔ Not authorized.")
 
-    text = update.message.text.replace("/addmovie", "").strip()
-    lines = text.split("\n")
-
-    # Detect input format
-    if len(lines) == 2:
-        title_quality_line, link = lines
-    else:
-        parts = text.split()
-        if len(parts) < 3:
-            return await send_temp_log(context, update.effective_chat.id,
-                "❌ Invalid format.\nUse:\nTitle  Quality  Link\nor\nTitle  Quality\nLink")
-        title_quality_line = " ".join(parts[:-1])
-        link = parts[-1]
-
-    match = re.match(r"(.+?)\s{2,}(\d{3,4}p)", title_quality_line)
-    if not match:
-        return await send_temp_log(context, update.effective_chat.id,
-            "❌ Couldn't parse title and quality. Use double space between them.")
-
-    title, quality = match.groups()
-    safe_key = clean_firebase_key(title)
-    movie = ref.child(safe_key).get() or {}
-
-    if quality in movie:
-        return await send_temp_log(context, update.effective_chat.id,
-            f"⚠️ Skipped: {title}  {quality} already exists")
-
-    try:
-        short_url = await asyncio.to_thread(_linkpay_shorten_url_sync, link)
-        ref.child(safe_key).update({quality: short_url})
-        return await send_temp_log(context, update.effective_chat.id,
-            f"✅ Added: {title}  {quality}  {short_url}")
-    except Exception as e:
-        return await send_temp_log(context, update.effective_chat.id,
-            f"❌ Failed: {title}  {quality} — error shortening or saving link")
+    action = context.args[0].lower() if context.args else ""
+    job = storage.get_doc("Jobs", LINK_CHECK_JOB) or {}
 
+    if action == "status":
+        if not job:
+            return await update.message.reply_text("ℹ️ No link check has run yet.")
+        return await update.message.reply_text(f"🔗 Link check: {link_check_status()}")
 
+    if action == "stop":
+        if state.owner(LINK_CHECK_LEASE) is None:
+            return await update.message.reply_text("ℹ️ No link check is running.")
+        stop_requests[LINK_CHECK_JOB] = True  # the worker running it stops at the next chunk
+        return await update.message.reply_text("🛑 Stopping link check. Run /checklinks to resume.")
 
+    resuming = job.get("status") in ("running", "stopped") and action != "restart"
+    if resuming:
+        storage.update_doc("Jobs", LINK_CHECK_JOB, {"status": "running"})
 
+    if not start_link_check(context.bot, fresh=not resuming):
+        return await update.message.reply_text("⏳ A link check is already running. Use /checklinks status.")
 
+    if resuming:
+        await update.message.reply_text(f"🔄 Resuming link check after {job.get('titles_done', 0)} titles…")
+    else:
+        await update.message.reply_text("🔗 Link check started. You'll get the dead-link report when it's done.")
 
 
 async def view_requests(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    requests_ref = db.reference("Requests")
-    requests_data = requests_ref.get()
-
-    if not requests_data:
+    """/request — aggregated request queue; /request rebuild backfills it from the raw log."""
+    if context.args and context.args[0].lower() == "rebuild" and update.effective_user.id == ADMIN_ID:
+        count = rebuild_request_summaries()
+        await update.message.reply_text(f"♻️ Backfilled request summary for {count} titles.")
+    elif storage.get_doc("Jobs", "requests_backfilled") is None:
+        # first run after upgrading: fold the old raw log into summaries, once
+        rebuild_request_summaries()
+
+    total, text, markup = build_requests_page(0)
+    if not total:
         return await update.message.reply_text("❌ No movie requests found.")
 
-    reply_lines = []
-    for key, info in requests_data.items():
-        title = escape_markdown(info.get("title", "Unknown"), version=2)
-        user = escape_markdown(str(info.get("user", "Unknown")), version=2)
-        timestamp = escape_markdown(info.get("timestamp", ""), version=2)
-        reply_lines.append(f"• *{title}* \\(User: `{user}`\\)")
+    await update.message.reply_text(text, parse_mode="MarkdownV2", reply_markup=markup)
 
-    reply_text = "\n".join(reply_lines)
-    await update.message.reply_text(
-        f"*📂 Movie Requests:*\n\n{reply_text}",
-        parse_mode="MarkdownV2"
-    )
+
+async def show_requests_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    _, page = query.data.split("|", 1)
+    total, text, markup = build_requests_page(int(page))
+    if not total:
+        return await query.edit_message_text("❌ No movie requests found.")
+    await query.edit_message_text(text, parse_mode="MarkdownV2", reply_markup=markup)
 
 async def show_user_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
@@ -615,9 +3236,7 @@ async def show_user_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return await update.message.reply_text("⛔ Not authorized.")
 
     try:
-        users_ref = db.reference("Users")
-        all_users = users_ref.get() or {}
-        count = len(all_users)
+        count = storage.count_users()
         await update.message.reply_text(f"👥 Total users: {count}")
     except Exception as e:
         await update.message.reply_text("❌ Error reading user stats.")
@@ -630,14 +3249,7 @@ async def scan_posters(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_user.id != ADMIN_ID:
         return
 
-    movies_ref = db.reference("movies")
-    movies = movies_ref.get() or {}
-
-    missing = []
-    for title, data in movies.items():
-        meta = (data or {}).get("meta") or {}
-        if not meta.get("poster"):   # no poster saved yet
-            missing.append(title)
+    missing = storage.keys_missing_poster()
 
     if not missing:
         await update.message.reply_text("✅ All movies already have posters saved.")
@@ -670,13 +3282,7 @@ async def show_missing_year_page(update: Update, context: ContextTypes.DEFAULT_T
     query = update.callback_query if hasattr(update, "callback_query") and update.callback_query else None
     message = query.message if query else update.message
     user_id = message.chat.id
-    movies = db.reference("movies").get() or {}
-    missing = []
-
-    for title, data in movies.items():
-        meta = (data or {}).get("meta") or {}
-        if "meta" not in data or not meta.get("year"):
-            missing.append(title)
+    missing = storage.keys_missing_year()
 
     if not missing:
         return await message.reply_text("🎯 All movies/series have a release year.")
@@ -771,12 +3377,11 @@ async def handle_new_title(update: Update, context: ContextTypes.DEFAULT_TYPE):
     old_key = clean_firebase_key(old_title)
     new_key = clean_firebase_key(new_title)
 
-    movie = ref.child(old_key).get()
+    movie = storage.get_movie(old_key)
     if not movie:
         return await update.message.reply_text("❌ Original movie not found.")
 
-    ref.child(new_key).set(movie)
-    ref.child(old_key).delete()
+    storage.rename_movie(old_key, new_key, movie)
 
     await send_temp_log(
         context, update.effective_chat.id,
@@ -820,13 +3425,7 @@ async def show_missing_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query if hasattr(update, "callback_query") and update.callback_query else None
     message = query.message if query else update.message
     user_id = message.chat.id
-    movies = get_movies()
-
-    missing = []
-    for t, d in movies.items():
-        meta = d.get("meta", {})
-        if not meta.get("poster"):
-            missing.append(t)
+    missing = storage.keys_missing_poster()
 
     if not missing:
         return await update.message.reply_text("🎉 All movies have posters!")
@@ -852,77 +3451,301 @@ async def show_missing_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
         reply_markup=InlineKeyboardMarkup(keyboard)
     )
 
-async def clean_titles(update: Update, context: ContextTypes.DEFAULT_TYPE):
+UNWANTED_TITLE_WORDS = [
+    "download", "full movie", "watch", "online",
+    "free", "movie", "hd", "bluray", "web-dl"
+]
+# one alternation, longest first so "full movie" wins over "movie"
+UNWANTED_TITLE_RE = re.compile(
+    r"(?i)\b(?:" + "|".join(re.escape(w) for w in sorted(UNWANTED_TITLE_WORDS, key=len, reverse=True)) + r")\b"
+)
+BULK_WRITE_CHUNK = 200  # titles per atomic multi-path update
+
+
+def plan_title_cleanup(movies: dict):
+    """Return (renames, skipped, unchanged) for /cleantitles without writing anything."""
+    renames = []  # (old_key, new_key)
+    skipped = []
+    unchanged = 0
+    taken = set(movies)
+
+    for key in movies:
+        cleaned_title = UNWANTED_TITLE_RE.sub("", key)
+        cleaned_title = re.sub(r"\s{2,}", " ", cleaned_title).strip()
+
+        if not cleaned_title or cleaned_title == key:
+            unchanged += 1
+            continue
+
+        new_key = clean_firebase_key(cleaned_title)
+        if new_key in taken:
+            skipped.append((key, new_key))
+            continue
+
+        taken.add(new_key)
+        renames.append((key, new_key))
+
+    return renames, skipped, unchanged
+
+
+async def clean_titles(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/cleantitles strips junk words from titles; /cleantitles dry only sends the plan."""
+    if update.effective_user.id != ADMIN_ID:
+        return await update.message.reply_text("⛔ Not authorized.")
+
+    dry_run = bool(context.args) and context.args[0].lower() in ("dry", "preview", "dryrun")
+    logging.info(f"✅ /cleantitles triggered (dry_run={dry_run})")
+
+    movies = get_movies()
+    renames, skipped, unchanged = plan_title_cleanup(movies)
+
+    if dry_run:
+        plan = [f"Rename plan: {len(renames)} renames, {len(skipped)} skipped, {unchanged} unchanged", ""]
+        plan += [f"{old} → {new}" for old, new in renames]
+        if skipped:
+            plan += ["", "Skipped (target title already exists):"]
+            plan += [f"{old} → {new}" for old, new in skipped]
+        return await update.message.reply_document(
+            document=BytesIO("\n".join(plan).encode("utf-8")),
+            filename="cleantitles_plan.txt",
+            caption=f"🧹 Dry run: {len(renames)} titles would be renamed. Send /cleantitles to apply."
+        )
+
+    cleaned = 0
+    failed = 0
+    changed_titles = []
+
+    for i in range(0, len(renames), BULK_WRITE_CHUNK):
+        chunk = renames[i:i + BULK_WRITE_CHUNK]
+        updates = {}
+        for old_key, new_key in chunk:
+            updates[new_key] = movies[old_key]
+            updates[old_key] = None
+
+        try:
+            # new key set and old key nulled in the same write
+            storage.update_paths(updates)
+        except Exception as e:
+            failed += len(chunk)
+            logging.error(f"❌ Failed to clean chunk starting at {chunk[0][0]}: {e}")
+            continue
+
+        cleaned += len(chunk)
+        changed_titles.extend(f"{old} → {new}" for old, new in chunk)
+
+    logging.info(f"✅ /cleantitles renamed {cleaned}, skipped {len(skipped)}, failed {failed}")
+
+    summary = (
+        f"✅ Clean complete:\n• Renamed: {cleaned}\n• Skipped: {len(skipped)}\n"
+        f"• Unchanged: {unchanged}"
+    )
+    if failed:
+        summary += f"\n• Failed: {failed}"
+    await update.message.reply_text(summary)
+
+    if changed_titles:
+        preview = "\n".join(changed_titles[:20])
+        await update.message.reply_text(f"*Changed Titles:*\n\n{preview}", parse_mode="Markdown")
+
+async def fix_movie_poster(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id != ADMIN_ID:
+        return await update.message.reply_text("Not allowed.")
+
+    args = context.args
+    if len(args) < 2:
+        return await update.message.reply_text("Usage:\n/fixposter MovieTitle URL")
+
+    title = " ".join(args[:-1])
+    url = args[-1]
+    key = clean_firebase_key(title)
+
+    if not storage.get_movie(key):
+        return await update.message.reply_text("Movie not found.")
+
+    storage.update_meta(key, {"poster": url})
+    await update.message.reply_text("Poster updated! 👌")
+
+
+def parse_mapping_lines(text: str, fields: tuple[str, str]):
+    """
+    Parse a bulk mapping file into (line_no, left, right) tuples.
+    Accepts JSONL ({"old": ..., "new": ...}) or one pair per line separated by
+    a tab, " → " or " -> ". Unparseable lines, and JSONL values that are
+    missing or not strings, come back with right=None.
+    """
+    pairs = []
+    for line_no, raw in enumerate(text.splitlines(), start=1):
+        line = raw.strip()
+        if not line or line.startswith("#"):
+            continue
+
+        if line.startswith("{"):
+            try:
+                obj = json.loads(line)
+            except json.JSONDecodeError:
+                obj = None
+            left, right = (obj.get(fields[0]), obj.get(fields[1])) if isinstance(obj, dict) else (None, None)
+            if isinstance(left, str) and isinstance(right, str):
+                pairs.append((line_no, left.strip(), right.strip() or None))
+            else:
+                pairs.append((line_no, line, None))
+            continue
+
+        for sep in ("\t", " → ", " -> "):
+            if sep in line:
+                left, right = line.split(sep, 1)
+                pairs.append((line_no, left.strip(), right.strip() or None))
+                break
+        else:
+            pairs.append((line_no, line, None))
+    return pairs
+
+
+def resolve_catalog_key(title: str, movies: dict, by_normalized: dict) -> str | None:
+    """Find the catalog key for a title: exact, sanitized, then case/space-insensitive."""
+    if title in movies:
+        return title
+    key = clean_firebase_key(title)
+    if key in movies:
+        return key
+    return by_normalized.get(normalize_title(title))
+
+
+def apply_in_chunks(updates_per_line: list[dict]) -> dict[int, str]:
+    """
+    Write per-line update dicts as chunked multi-path updates.
+    A failed chunk is retried line by line, so only the lines that still fail are
+    reported. Returns {index in updates_per_line: error}.
+    """
+    failed = {}
+    for i in range(0, len(updates_per_line), BULK_WRITE_CHUNK):
+        chunk = updates_per_line[i:i + BULK_WRITE_CHUNK]
+        merged = {}
+        for updates in chunk:
+            merged.update(updates)
+        try:
+            storage.update_paths(merged)
+            continue
+        except Exception as e:
+            logging.error(f"❌ Bulk write failed ({len(chunk)} lines), retrying line by line: {e}")
+
+        for j, updates in enumerate(chunk, start=i):
+            try:
+                storage.update_paths(updates)
+            except Exception as e:
+                failed[j] = str(e)[:200] or type(e).__name__
+    return failed
+
+
+async def rename_bulk(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/renamebulk — the next document (or one captioned /renamebulk) is an old → new title map."""
     if update.effective_user.id != ADMIN_ID:
         return await update.message.reply_text("⛔ Not authorized.")
+    context.user_data["awaiting_bulk_file"] = "rename"
+    await update.message.reply_text(
+        "📄 Send a .tsv/.txt/.jsonl file, one rename per line:\n"
+        "Old Title<TAB>New Title  or  {\"old\": \"...\", \"new\": \"...\"}"
+    )
 
-    logging.info("✅ /cleantitles triggered")
-
-    unwanted_words = [
-        "download", "full movie", "watch", "online",
-        "free", "movie", "hd", "bluray", "web-dl"
-    ]
 
-    movies = get_movies()
-    cleaned = 0
-    skipped = 0
-    unchanged = 0
-    changed_titles = []
+async def poster_bulk(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/posterbulk — the next document (or one captioned /posterbulk) is a title → poster URL map."""
+    if update.effective_user.id != ADMIN_ID:
+        return await update.message.reply_text("⛔ Not authorized.")
+    context.user_data["awaiting_bulk_file"] = "poster"
+    await update.message.reply_text(
+        "📄 Send a .tsv/.txt/.jsonl file, one poster per line:\n"
+        "Movie Title<TAB>https://poster.url  or  {\"title\": \"...\", \"poster\": \"...\"}"
+    )
 
-    for key in list(movies.keys()):
-        original_title = key
-        cleaned_title = original_title
 
-        for word in unwanted_words:
-            cleaned_title = re.sub(rf"(?i)\b{re.escape(word)}\b", "", cleaned_title)
+async def apply_bulk_mapping(update: Update, context: ContextTypes.DEFAULT_TYPE, mode: str):
+    """Validate an uploaded rename/poster map against the catalog and apply it in a few writes."""
+    file_obj = await update.message.document.get_file()
+    text = (await file_obj.download_as_bytearray()).decode("utf-8", errors="ignore")
 
-        cleaned_title = re.sub(r"\s{2,}", " ", cleaned_title).strip()
+    fields = ("old", "new") if mode == "rename" else ("title", "poster")
+    pairs = parse_mapping_lines(text, fields)
+    if not pairs:
+        return await update.message.reply_text("❌ The file is empty.")
 
-        if not cleaned_title or cleaned_title == original_title:
-            unchanged += 1
-            continue
+    movies = get_movies()
+    by_normalized = {normalize_title(k): k for k in movies}
 
-        new_key = clean_firebase_key(cleaned_title)
+    report = []
+    pending = []  # (line_no, description, updates)
+    sources = set()
+    targets = set()
 
-        if ref.child(new_key).get():
-            logging.info(f"⚠️ Skipped (exists): {cleaned_title}")
-            skipped += 1
+    for line_no, left, right in pairs:
+        if not right:
+            report.append(f"{line_no}: ❌ invalid line")
             continue
 
-        try:
-            ref.child(new_key).set(movies[original_title])
-            ref.child(original_title).delete()
-            logging.info(f"✅ Renamed: {original_title} → {cleaned_title}")
-            changed_titles.append(f"{original_title} → {cleaned_title}")
-            cleaned += 1
-        except Exception as e:
-            logging.error(f"❌ Failed to clean {original_title}: {e}")
+        key = resolve_catalog_key(left, movies, by_normalized)
+        if not key:
+            report.append(f"{line_no}: ❌ not found: {left}")
+            continue
+        if key in sources:
+            report.append(f"{line_no}: ❌ duplicate in file: {key}")
+            continue
 
-    summary = f"✅ Clean complete:\n• Renamed: {cleaned}\n• Skipped: {skipped}\n• Unchanged: {unchanged}"
-    await update.message.reply_text(summary)
+        if mode == "rename":
+            new_key = clean_firebase_key(right)
+            if new_key == key:
+                report.append(f"{line_no}: ⏭ unchanged: {key}")
+                continue
+            if new_key in movies or new_key in targets:
+                report.append(f"{line_no}: ❌ target exists: {new_key}")
+                continue
+            targets.add(new_key)
+            pending.append((line_no, f"{key} → {new_key}", {new_key: movies[key], key: None}))
+        else:
+            if not right.startswith("http"):
+                report.append(f"{line_no}: ❌ invalid URL: {right}")
+                continue
+            pending.append((line_no, f"{key} 🖼 {right}", {f"{key}/meta/poster": right}))
 
-    if changed_titles:
-        preview = "\n".join(changed_titles[:20])
-        await update.message.reply_text(f"*Changed Titles:*\n\n{preview}", parse_mode="Markdown")
+        sources.add(key)
 
-async def fix_movie_poster(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if update.effective_user.id != ADMIN_ID:
-        return await update.message.reply_text("Not allowed.")
+    failed = apply_in_chunks([updates for _, _, updates in pending])
+    written = len(pending) - len(failed)
+    status = "✅" if not failed else "⚠️"
+    for i, (line_no, description, _) in enumerate(pending):
+        if i in failed:
+            report.append(f"{line_no}: ❌ write failed: {description} — {failed[i]}")
+        else:
+            report.append(f"{line_no}: ✅ {description}")
+    report.sort(key=lambda line: int(line.split(":", 1)[0]))
+
+    label = "Renamed" if mode == "rename" else "Posters set"
+    summary = (
+        f"{status} Bulk {mode} finished\n"
+        f"• {label}: {written}\n"
+        f"• Rejected: {len(pairs) - len(pending)}"
+    )
+    if failed:
+        summary += f"\n• Failed writes: {len(failed)}"
 
-    args = context.args
-    if len(args) < 2:
-        return await update.message.reply_text("Usage:\n/fixposter MovieTitle URL")
+    await update.message.reply_document(
+        document=BytesIO("\n".join(report).encode("utf-8")),
+        filename=f"{mode}bulk_report.txt",
+        caption=summary
+    )
 
-    title = " ".join(args[:-1])
-    url = args[-1]
-    key = clean_firebase_key(title)
 
-    ref = db.reference("movies")
-    if not ref.child(key).get():
-        return await update.message.reply_text("Movie not found.")
+async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Route uploaded files: /renamebulk and /posterbulk maps, otherwise /uploadbulk."""
+    caption = (update.message.caption or "").strip().lower()
+    mode = context.user_data.pop("awaiting_bulk_file", None)
+    if caption.startswith("/renamebulk"):
+        mode = "rename"
+    elif caption.startswith("/posterbulk"):
+        mode = "poster"
 
-    ref.child(key).child("meta").update({"poster": url})
-    await update.message.reply_text("Poster updated! 👌")
+    if mode and update.effective_user.id == ADMIN_ID:
+        return await apply_bulk_mapping(update, context, mode)
+    return await upload_bulk(update, context)
 
 def extract_title_and_year(raw_title: str) -> tuple[str, str | None]:
     """
@@ -975,7 +3798,7 @@ def _fetch_tmdb_meta_sync(title: str, year: str | None) -> dict | None:
         data = resp.json()
         results = data.get("results") or []
         if not results:
-            logging.info(f"TMDB: no results for '{title}' ({year})")
+            hot_log.log(logging.INFO, "tmdb.miss", f"TMDB: no results for '{title}' ({year})", title=title)
             return None
 
         # prefer movie/tv results
@@ -1006,7 +3829,7 @@ def _fetch_tmdb_meta_sync(title: str, year: str | None) -> dict | None:
             "is_series": picked.get("media_type") == "tv",
             "tmdb_title": picked.get("name") or picked.get("title") or title,
         }
-        logging.info(f"TMDB meta for '{title}': {meta}")
+        hot_log.log(logging.INFO, "tmdb.meta", f"TMDB meta for '{title}': {meta}", title=title)
         return meta
 
     except Exception as e:
@@ -1062,17 +3885,10 @@ def get_movies_added_today():
     Return a list of (title, data) for movies added in the last 24 hours,
     preserving Firebase natural order (same as get_movies().items()).
     """
-    movies = get_movies()  # dict in Firebase order
-    movie_list = list(movies.items())
-
     now = int(time.time())
     one_day = 86400  # seconds in 24 hours
 
-    today_movies = [
-        (title, data) for title, data in movie_list
-        if data.get("meta", {}).get("date_added", 0) > now - one_day
-    ]
-    return today_movies
+    return storage.movies_added_since(now - one_day)
 
 
 
@@ -1099,11 +3915,6 @@ async def fetch_tmdb_meta_for_title(title: str):
     # Detect series season (S01, S02)
     is_series_title = bool(re.search(r"S\d{1,2}", title, re.IGNORECASE))
 
-    headers = {
-        "Authorization": f"Bearer {TMDB_TOKEN}",
-        "Accept": "application/json",
-    }
-
     params = {
         "query": cleaned,
         "include_adult": "false",
@@ -1112,8 +3923,8 @@ async def fetch_tmdb_meta_for_title(title: str):
         params["year"] = input_year
 
     try:
-        resp = requests.get(f"{TMDB_BASE_URL}/search/multi",
-                            headers=headers, params=params, timeout=10)
+        resp = await get_http_client().get(f"{TMDB_BASE_URL}/search/multi",
+                                           headers=tmdb_headers(), params=params)
         resp.raise_for_status()
         data = resp.json()
 
@@ -1172,65 +3983,382 @@ async def fetch_tmdb_meta_for_title(title: str):
 
 
 
+async def fetch_season_posters(tmdb_id, season_numbers) -> dict[int, str]:
+    """
+    Season poster URLs for a TV show, fetched with append_to_response so one
+    request covers up to TMDB_APPEND_LIMIT seasons.
+    """
+    posters = {}
+    numbers = sorted(set(season_numbers))
+
+    for i in range(0, len(numbers), TMDB_APPEND_LIMIT):
+        chunk = numbers[i:i + TMDB_APPEND_LIMIT]
+        try:
+            resp = await get_http_client().get(
+                f"{TMDB_BASE_URL}/tv/{tmdb_id}",
+                headers=tmdb_headers(),
+                params={"append_to_response": ",".join(f"season/{n}" for n in chunk)},
+            )
+            resp.raise_for_status()
+            data = resp.json()
+        except Exception as e:
+            logging.warning(f"TMDB season fetch failed for {tmdb_id} {chunk}: {e}")
+            continue
+
+        # the show's own "seasons" list also carries poster paths
+        listed = {s.get("season_number"): s.get("poster_path") for s in data.get("seasons") or []}
+        for n in chunk:
+            poster_path = (data.get(f"season/{n}") or {}).get("poster_path") or listed.get(n)
+            if poster_path:
+                posters[n] = TMDB_IMAGE_BASE + poster_path
+
+    return posters
+
+
 async def ensure_poster_for_movie(key: str, force: bool = False):
-    movie_ref = db.reference("movies").child(key)
-    data = movie_ref.get() or {}
+    data = storage.get_movie(key) or {}
 
     meta = data.get("meta") or {}
 
-    # Skip if already has poster and not force
-    if meta.get("poster") and not force:
+    # Skip if already has poster and not force, unless the metadata is incomplete or stale
+    if meta.get("poster") and not force and not needs_enrichment(meta):
         return
 
     tmdb_meta = await fetch_tmdb_meta_for_title(key)
     if not tmdb_meta:
+        # remember the attempt so views don't re-queue it until the retry window passes
+        if storage.get_movie(key):
+            storage.update_meta(key, {"enriched_at": int(time.time())})
         return
 
-    # Save MAIN poster for Movie or entire Series
-    movie_ref.child("meta").update({
-        "poster": tmdb_meta.get("poster"),
-        "is_series": tmdb_meta.get("is_series", False),
-        "tmdb_id": tmdb_meta.get("tmdb_id"),
-        "year": tmdb_meta.get("year"),
-        "tmdb_title": tmdb_meta.get("tmdb_title"),
-    })
-
-    # If not a series → stop here
-    if not tmdb_meta.get("is_series"):
-        return
+    # MAIN poster for Movie or entire Series (+ season posters below), one write
+    updates = {
+        f"{key}/meta/enriched_at": int(time.time()),
+        f"{key}/meta/poster": tmdb_meta.get("poster"),
+        f"{key}/meta/is_series": tmdb_meta.get("is_series", False),
+        f"{key}/meta/tmdb_id": tmdb_meta.get("tmdb_id"),
+        f"{key}/meta/year": tmdb_meta.get("year"),
+        f"{key}/meta/tmdb_title": tmdb_meta.get("tmdb_title"),
+    }
+    if not force:
+        # a revalidation only fills in and refreshes: it keeps a poster set by hand
+        # (/fixposter) and never clears a field TMDB left out this time
+        if meta.get("poster") and not str(meta["poster"]).startswith(TMDB_IMAGE_BASE):
+            del updates[f"{key}/meta/poster"]
+        updates = {path: value for path, value in updates.items() if value is not None}
 
     # Extract Seasons from Keys (Quality lines remain untouched)
     season_keys = [k for k in data.keys() if re.match(r"S\d{1,2}", k)]
 
-    if not season_keys:
+    if tmdb_meta.get("is_series") and season_keys:
+        season_numbers = {k: int(re.findall(r"\d+", k)[0]) for k in season_keys}
+        posters = await fetch_season_posters(tmdb_meta.get("tmdb_id"), season_numbers.values())
+        for season_key, season_num in season_numbers.items():
+            if posters.get(season_num):
+                updates[f"{key}/{season_key}/poster"] = posters[season_num]
+
+    storage.update_paths(updates)
+
+def trigrams(text: str) -> list[str]:
+    padded = f" {text} "
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+class FuzzyMatcher:
+    """
+    Typo-tolerant title lookup.
+    Candidates come from a trigram index (ranked by Jaccard overlap), then only
+    those are rescored with SequenceMatcher — the same ratio difflib uses —
+    so a miss costs a few hundred comparisons instead of one per title.
+    Titles can be added/removed in place as the catalog changes.
+    """
+
+    def __init__(self, normalized: dict[str, str], candidates: int = 300):
+        self.keys = []
+        self.names = []
+        self.gram_counts = []
+        self.ids = {}  # key -> title id
+        self.index = defaultdict(set)  # trigram -> title ids
+        self.candidates = candidates
+        for key, name in normalized.items():
+            self.add(key, name)
+
+    def add(self, key: str, name: str):
+        if key in self.ids:
+            self.remove(key)
+        i = len(self.keys)
+        grams = set(trigrams(name))
+        self.ids[key] = i
+        self.keys.append(key)
+        self.names.append(name)
+        self.gram_counts.append(len(grams))
+        for gram in grams:
+            self.index[gram].add(i)
+
+    def remove(self, key: str):
+        i = self.ids.pop(key, None)
+        if i is None:
+            return
+        for gram in set(trigrams(self.names[i])):
+            self.index[gram].discard(i)
+        self.keys[i] = self.names[i] = None
+
+    def scan(self, query: str) -> list[str]:
+        """Substring matches in catalog order."""
+        return [
+            key for key, name in zip(self.keys, self.names)
+            if name is not None and query in name
+        ]
+
+    def match(self, query: str, n: int = 10, cutoff: float = 0.5) -> list[str]:
+        query_grams = set(trigrams(query))
+        postings = sorted(
+            (self.index[g] for g in query_grams if g in self.index),
+            key=len
+        )
+        if not postings:
+            return []
+        # grams shared by a large share of titles ("the", " th") add cost but no signal
+        max_postings = max(1000, len(self.ids) // 10)
+        rare = [p for p in postings if len(p) <= max_postings] or postings[:1]
+
+        shared = Counter()
+        for ids in rare:
+            shared.update(ids)
+
+        def jaccard(i):
+            overlap = shared[i]
+            return overlap / (len(query_grams) + self.gram_counts[i] - overlap)
+
+        pool = heapq.nlargest(self.candidates, shared, key=jaccard)
+
+        scorer = difflib.SequenceMatcher()
+        scorer.set_seq2(query)
+        scored = []
+        for i in pool:
+            scorer.set_seq1(self.names[i])
+            if scorer.real_quick_ratio() >= cutoff and scorer.quick_ratio() >= cutoff:
+                ratio = scorer.ratio()
+                if ratio >= cutoff:
+                    scored.append((ratio, self.names[i], i))
+
+        # ties broken by name, like difflib.get_close_matches
+        return [self.keys[i] for _, _, i in heapq.nlargest(n, scored)]
+
+
+def get_title_matcher() -> FuzzyMatcher:
+    """Return the title index, rebuilding it only after a full catalog reload."""
+    movies = catalog.get()
+    if title_matcher["loads"] != catalog.loads:
+        title_matcher["matcher"] = FuzzyMatcher({title: normalize_title(title) for title in movies})
+        title_matcher["loads"] = catalog.loads
+    return title_matcher["matcher"]
+
+
+def update_title_matcher(key, old, new):
+    """Keep the title index in step with local writes."""
+    matcher = title_matcher["matcher"]
+    if matcher is None or title_matcher["loads"] != catalog.loads:
         return
+    if new is None:
+        matcher.remove(key)
+    elif old is None:
+        matcher.add(key, normalize_title(key))
 
-    headers = {
-        "Authorization": f"Bearer {TMDB_TOKEN}",
-        "Accept": "application/json",
-    }
 
-    tmdb_id = tmdb_meta.get("tmdb_id")
+catalog.subscribers.append(update_title_matcher)
 
-    for season_key in season_keys:
-        season_num = int(re.findall(r"\d+", season_key)[0])
 
-        try:
-            r = requests.get(
-                f"{TMDB_BASE_URL}/tv/{tmdb_id}/season/{season_num}",
-                headers=headers,
-                timeout=10,
-            )
-            r.raise_for_status()
-            season_data = r.json()
-            poster_path = season_data.get("poster_path")
+def find_matches(query: str) -> list[str]:
+    """
+    Ranked catalog keys for a search: substring hits, else fuzzy matches.
+    Hot queries are answered from search_cache until the catalog version changes.
+    """
+    query = normalize_title(query)
+    version = catalog.current_version()
 
-            if poster_path:
-                poster_url = TMDB_IMAGE_BASE + poster_path
-                movie_ref.child(season_key).update({"poster": poster_url})
+    matches = search_cache.get(query, version)
+    if matches is None:
+        matcher = get_title_matcher()
+        matches = matcher.scan(query) or matcher.match(query, n=10, cutoff=0.5)
+        search_cache.put(query, matches, version)
+    return matches
+
+
+def needs_enrichment(meta: dict) -> bool:
+    """
+    Poster or year missing and no TMDB attempt within the retry window,
+    or complete metadata last fetched more than ENRICH_REFRESH_DAYS ago.
+    """
+    last_attempt = meta.get("enriched_at") or 0
+    if not meta.get("poster") or not meta.get("year"):
+        return time.time() - last_attempt > ENRICH_RETRY_HOURS * 3600
+    return time.time() - last_attempt > ENRICH_REFRESH_DAYS * 86400
+
+
+class EnrichmentQueue:
+    """
+    Background TMDB enrichment with a single worker.
+    A title is queued at most once at a time, however many users open it.
+    """
+
+    def __init__(self):
+        self.queue = asyncio.Queue()
+        self.pending = set()
+        self.worker = None
+        self.done = 0
+        self.failed = 0
+
+    def submit(self, key: str, force: bool = False) -> bool:
+        if key in self.pending:
+            return False
+        self.pending.add(key)
+        self.queue.put_nowait((key, force))
+        if self.worker is None or self.worker.done():
+            self.worker = spawn(self._run())
+        return True
+
+    async def _run(self):
+        while True:
+            key, force = await self.queue.get()
+            try:
+                await ensure_poster_for_movie(key, force=force)
+                self.done += 1
+            except Exception as e:
+                self.failed += 1
+                logging.warning(f"Enrichment failed for {key}: {e}")
+            finally:
+                self.pending.discard(key)
+                self.queue.task_done()
+
+    def stats(self) -> str:
+        return f"{len(self.pending)} queued, {self.done} done, {self.failed} failed"
+
+
+enrichment_queue = EnrichmentQueue()
+
+
+def prefix_tokens(text: str) -> str:
+    """normalize_title with punctuation dropped, so 'spider-man' and 'spider man' agree."""
+    return " ".join(re.sub(r"[^\w\s]", " ", normalize_title(text)).split())
+
+
+class PrefixIndex:
+    """
+    Sorted (suffix, key) pairs for every word start of each normalized title, so a
+    prefix query is a bisect plus a short forward scan: 'dark kn' finds 'The Dark Knight'.
+    Built once per catalog load, then patched per write.
+    """
+
+    def __init__(self):
+        self.entries = []
+        self.loads = None
+
+    @staticmethod
+    def suffixes(key: str) -> list[str]:
+        words = prefix_tokens(key).split()
+        return [" ".join(words[i:]) for i in range(len(words))]
+
+    def sync(self) -> list:
+        movies = catalog.get()
+        if self.loads != catalog.loads:
+            self.entries = sorted((suffix, key) for key in movies for suffix in self.suffixes(key))
+            self.loads = catalog.loads
+        return self.entries
+
+    def apply(self, key, old, new):
+        if self.loads != catalog.loads or (old is None) == (new is None):
+            return
+        for suffix in self.suffixes(key):
+            if new is None:
+                i = bisect.bisect_left(self.entries, (suffix, key))
+                if i < len(self.entries) and self.entries[i] == (suffix, key):
+                    del self.entries[i]
+            else:
+                bisect.insort(self.entries, (suffix, key))
+
+    def search(self, query: str, limit: int) -> list[str]:
+        """Keys whose title starts with `query`, then those with a later word starting with it."""
+        entries = self.sync()
+        query = prefix_tokens(query)
+        if not query:
+            return []
+        title_starts, word_starts = [], []
+        seen = set()
+        i = bisect.bisect_left(entries, (query, ""))
+        # bounded scan: a very short prefix can match a large part of the catalog
+        while i < len(entries) and entries[i][0].startswith(query) and len(seen) < limit * 5:
+            suffix, key = entries[i]
+            if key not in seen:
+                seen.add(key)
+                (title_starts if prefix_tokens(key) == suffix else word_starts).append(key)
+            i += 1
+        title_starts.sort(key=len)
+        word_starts.sort(key=len)
+        return (title_starts + word_starts)[:limit]
+
+
+prefix_index = PrefixIndex()
+catalog.subscribers.append(prefix_index.apply)
+
+
+def inline_result(key: str, movie: dict):
+    """Poster result with quality buttons, or a text result when there is no poster."""
+    meta = movie.get("meta") or {}
+    title = key.replace("_", " ")
+    year = meta.get("year")
+    links = [(q, url) for q, url in movie.items() if q != "meta" and isinstance(url, str)]
+    markup = InlineKeyboardMarkup([[InlineKeyboardButton(f"{q} 🔗", url=url)] for q, url in links]) if links else None
+    description = ", ".join(q for q, _ in links) or "No links yet"
+    caption = f"🎬 {title}" + (f" ({year})" if year and f"({year})" not in title else "")
+    result_id = hashlib.md5(key.encode("utf-8")).hexdigest()
+
+    poster = meta.get("poster")
+    if poster:
+        return InlineQueryResultPhoto(
+            id=result_id,
+            photo_url=poster,
+            thumbnail_url=poster.replace("/w500/", "/w92/"),
+            title=title,
+            description=description,
+            caption=caption,
+            reply_markup=markup,
+        )
+    return InlineQueryResultArticle(
+        id=result_id,
+        title=title,
+        description=description,
+        input_message_content=InputTextMessageContent(caption),
+        reply_markup=markup,
+    )
+
+
+def inline_results(query: str) -> list:
+    """Built results for an inline query, cached per normalized query and catalog version."""
+    normalized = prefix_tokens(query)
+    version = catalog.current_version()
+    cached = inline_cache.get(normalized, version)
+    if cached is not None:
+        return cached
+
+    movies = get_movies()
+    if normalized:
+        keys = prefix_index.search(normalized, INLINE_RESULTS)
+    else:
+        keys = [key for _, key in BROWSE_VIEWS["new"].sync()[:INLINE_RESULTS]]
+    results = [inline_result(key, movies[key]) for key in keys if key in movies]
+    inline_cache.put(normalized, results, version)
+    return results
+
+
+async def inline_search(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """@bot <title> in any chat: prefix search, answered from the in-memory index."""
+    inline_query = update.inline_query
+    if inline_query is None:
+        return
+    results = inline_results(inline_query.query or "")
+    await inline_query.answer(results, cache_time=INLINE_CACHE_SECONDS, is_personal=False)
 
-        except Exception:
-            continue
 
 async def search_movie(update: Update, context: ContextTypes.DEFAULT_TYPE):
     ensure_user_saved(update, context)
@@ -1251,97 +4379,301 @@ async def search_movie(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
         query = " ".join(args).strip().lower()
 
-    movies = get_movies()
-    normalized = {title: title.replace("_", " ").lower() for title in movies}
-
-    # substring match
-    substring_matches = [
-        key for key, name in normalized.items() if query in name
-    ]
-
-    # fuzzy match if needed
-    if substring_matches:
-        final_matches = substring_matches
-    else:
-        close = difflib.get_close_matches(query, normalized.values(), n=10, cutoff=0.5)
-        final_matches = [k for k, v in normalized.items() if v in close]
+    final_matches = find_matches(query)
+    search_id = search_results_id(query, catalog.version)
+    search_results[search_id] = {"query": query, "version": catalog.version, "keys": final_matches}
 
     if not final_matches:
         msg = await update.message.reply_text("❌ No matching movies found.")
         user_last_bot_message[user_id] = msg.message_id
         return
 
-    # Build keyboard
-    keyboard = []
+    text, markup = build_search_page(search_id, final_matches, 0)
+    msg = await update.message.reply_text(text, reply_markup=markup)
 
-    for title in final_matches:
-        safe = clean_firebase_key(title)
-        safe = re.sub(r'[^a-zA-Z0-9_\-]', '', safe)
-        safe = safe[:50]
+    user_last_bot_message[user_id] = msg.message_id
 
-        keyboard.append([
-            InlineKeyboardButton(
-                title.replace("_", " "),
-                callback_data=f"movie|{safe}"
-            )
-        ])
 
-    msg = await update.message.reply_text(
-        f"🔍 Found {len(final_matches)} matching movie(s):",
-        reply_markup=InlineKeyboardMarkup(keyboard)
-    )
+def callback_id(title: str) -> str:
+    """The ≤50-char id a title gets in movie|… callback data."""
+    safe = clean_firebase_key(title)
+    safe = re.sub(r'[^a-zA-Z0-9_\-]', '', safe)
+    return safe[:50]
+
+
+def movie_callback_data(title: str) -> str:
+    return f"movie|{callback_id(title)}"
+
+
+def get_callback_index() -> dict:
+    """callback id -> catalog key (first title wins, like the old linear scan)."""
+    movies = catalog.get()
+    if callback_index["loads"] != catalog.loads:
+        index = {}
+        for title in movies:
+            index.setdefault(callback_id(title), title)
+        callback_index["index"] = index
+        callback_index["loads"] = catalog.loads
+    return callback_index["index"]
+
+
+def update_callback_index(key, old, new):
+    if callback_index["loads"] != catalog.loads:
+        return
+    index = callback_index["index"]
+    safe = callback_id(key)
+    if new is None and index.get(safe) == key:
+        # long titles can share an id; the next one in catalog order takes over, as in a rebuild
+        other = next((title for title in catalog.data or {} if callback_id(title) == safe), None)
+        if other is None:
+            del index[safe]
+        else:
+            index[safe] = other
+    elif old is None and new is not None:
+        index.setdefault(safe, key)
+
+
+catalog.subscribers.append(update_callback_index)
+
+
+def search_results_id(query: str, version: int) -> str:
+    """Id of one result list: the same query at the same catalog version shares it."""
+    return hashlib.blake2b(f"{query}\0{version}".encode("utf-8"), digest_size=6).hexdigest()
+
+
+def build_search_page(search_id: str, keys: list[str], page: int):
+    """Text + keyboard for one page of stored search results; buttons carry sp|<search id>|<page>."""
+    pages = max(1, -(-len(keys) // SEARCH_RESULTS_PER_PAGE))
+    page = max(0, min(page, pages - 1))
+    start = page * SEARCH_RESULTS_PER_PAGE
+
+    keyboard = [
+        [InlineKeyboardButton(title.replace("_", " "), callback_data=movie_callback_data(title))]
+        for title in keys[start:start + SEARCH_RESULTS_PER_PAGE]
+    ]
+
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton("⬅ Prev", callback_data=f"sp|{search_id}|{page - 1}"))
+    if page < pages - 1:
+        nav.append(InlineKeyboardButton("➡ Next", callback_data=f"sp|{search_id}|{page + 1}"))
+    if nav:
+        keyboard.append(nav)
+
+    text = f"🔍 Found {len(keys)} matching movie(s):"
+    if pages > 1:
+        text += f"\n📄 Page {page + 1}/{pages}"
+    return text, InlineKeyboardMarkup(keyboard)
+
+
+async def show_search_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Prev/Next on search results: page through the stored list, no re-search."""
+    query = update.callback_query
+    parts = query.data.split("|")
+    cached = search_results.get(parts[1]) if len(parts) == 3 else None  # sp|<page> buttons predate ids
+    if not cached:
+        return await query.edit_message_text("⌛ Search expired. Please type the movie name again.")
+
+    text, markup = build_search_page(parts[1], cached["keys"], int(parts[2]))
+    await query.edit_message_text(text, reply_markup=markup)
+
+class SortedView:
+    """
+    Catalog keys ordered by (value(key, entry), key), leaving out entries whose value is None.
+    Built once per catalog load, then patched with a bisect per write.
+    """
+
+    def __init__(self, label: str, value):
+        self.label = label
+        self.value = value
+        self.entries = []
+        self.loads = None
+
+    def _value(self, key, entry):
+        if entry is None:
+            return None
+        try:
+            return self.value(key, entry)
+        except (KeyError, TypeError, ValueError, AttributeError):
+            return None
+
+    def sync(self) -> list:
+        movies = catalog.get()
+        if self.loads != catalog.loads:
+            entries = [(self._value(key, entry), key) for key, entry in movies.items()]
+            self.entries = sorted(e for e in entries if e[0] is not None)
+            self.loads = catalog.loads
+        return self.entries
+
+    def apply(self, key, old, new):
+        if self.loads != catalog.loads:
+            return
+        before, after = self._value(key, old), self._value(key, new)
+        if before == after:
+            return
+        if before is not None:
+            i = bisect.bisect_left(self.entries, (before, key))
+            if i < len(self.entries) and self.entries[i] == (before, key):
+                del self.entries[i]
+        if after is not None:
+            bisect.insort(self.entries, (after, key))
+
+    def locate(self, value, key_hash: str = "", prefix: bool = False) -> int:
+        """
+        Index of the entry a cursor points at: the first entry >= value, moved forward to the
+        one whose key hashes to key_hash among those sharing the (possibly cut) value.
+        Falls back to the first entry >= value if that title is gone.
+        """
+        entries = self.entries
+        start = bisect.bisect_left(entries, (value, ""))
+        if key_hash:
+            i = start
+            while i < len(entries) and (entries[i][0].startswith(value) if prefix else entries[i][0] == value):
+                if cursor_hash(entries[i][1]) == key_hash:
+                    return i
+                i += 1
+        return start
+
+
+def entry_year(entry) -> int | None:
+    match = re.match(r"\d{4}", str(((entry or {}).get("meta") or {}).get("year") or ""))
+    return int(match.group()) if match else None
+
+
+BROWSE_VIEWS = {
+    "az": SortedView("🔤 A–Z", lambda key, entry: key.casefold()),
+    "new": SortedView("🆕 Latest", lambda key, entry: -int(entry["meta"]["date_added"])),
+    "year": SortedView("📅 By year", lambda key, entry: -entry_year(entry)),
+    "ser": SortedView(
+        "📺 Series",
+        lambda key, entry: key.casefold() if (entry.get("meta") or {}).get("is_series") else None,
+    ),
+}
+INT_VIEWS = {"new", "year"}  # views whose cursor value is a number
+JUMP_LETTERS = "#ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+
+def update_browse_views(key, old, new):
+    for view in BROWSE_VIEWS.values():
+        view.apply(key, old, new)
+
+
+catalog.subscribers.append(update_browse_views)
+
+
+def utf8_prefix(text: str, limit: int) -> str:
+    return text.encode("utf-8")[:max(0, limit)].decode("utf-8", errors="ignore")
+
+
+def cursor_hash(key: str) -> str:
+    """12 hex chars that pick one title out of those sharing a (cut) sort value."""
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=6).hexdigest()
+
+
+CURSOR_HASH = re.compile(r"[0-9a-f]{12}|")
+
+
+def browse_callback(mode: str, direction: str, entry=None) -> str:
+    """
+    mv|<mode>|<f or b>|<key hash>|<sort value>. Text values are cut to fit
+    CALLBACK_DATA_BYTES; the key hash then finds the exact title among those sharing
+    the cut value. An empty hash (letter jumps) means "first title >= value".
+    """
+    head = f"mv|{mode}|{direction}|"
+    if entry is None:
+        return head
+    value, key = entry
+    head += f"{cursor_hash(key) if key else ''}|"
+    return head + utf8_prefix(str(value), CALLBACK_DATA_BYTES - len(head.encode()))
+
+
+def parse_browse_callback(data: str):
+    """Inverse of browse_callback: (mode, backwards, cursor or None), cursor = (value, key hash)."""
+    _, mode, direction, rest = data.split("|", 3)
+    if mode not in BROWSE_VIEWS:
+        mode = "az"
+    cursor = None
+    if rest:
+        key_hash, sep, value = rest.partition("|")
+        if not (sep and CURSOR_HASH.fullmatch(key_hash)):
+            # buttons from before key hashes: "<value>" or "<value>|<key prefix>"
+            key_hash, value = "", rest.partition("|")[0] if mode in INT_VIEWS else rest
+        cursor = (int(value) if mode in INT_VIEWS else value, key_hash)
+    return mode, direction == "b", cursor
 
-    user_last_bot_message[user_id] = msg.message_id
 
 async def list_movies(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     await delete_last(user_id, context)
-    user_movie_offset[user_id] = 0
     await show_movie_page(user_id, context, update.message.reply_text)
 
-async def show_movie_page(user_id, context, send_func):
-    movies = list(get_movies().keys())
-    offset = user_movie_offset.get(user_id, 0)
+async def show_movie_page(user_id, context, send_func, mode: str = "az", cursor=None, backwards: bool = False):
+    """
+    One /movies page of a browse view. Forward pages start at the first entry >= cursor;
+    backward pages end just before it. Cursors travel in the callback data, so a tap
+    costs a bisect and a slice whatever the catalog size.
+    """
+    view = BROWSE_VIEWS.get(mode) or BROWSE_VIEWS["az"]
+    entries = view.sync()
+    position = view.locate(*cursor, prefix=mode not in INT_VIEWS) if cursor else 0
+    if backwards:
+        offset = max(0, position - MOVIES_PER_PAGE)
+    else:
+        offset = position
     end = offset + MOVIES_PER_PAGE
-    current_page = movies[offset:end]
-
-    keyboard = []
+    current_page = entries[offset:end]
 
-    for title in current_page:
-        safe = clean_firebase_key(title)
-        safe = re.sub(r'[^a-zA-Z0-9_\-]', '', safe)
-        safe = safe[:50]
+    keyboard = [[
+        InlineKeyboardButton(("• " if m == mode else "") + v.label, callback_data=browse_callback(m, "f"))
+        for m, v in BROWSE_VIEWS.items()
+    ]]
 
+    for _, title in current_page:
         keyboard.append([
             InlineKeyboardButton(
                 title.replace("_", " "),
-                callback_data=f"movie|{safe}"
+                callback_data=movie_callback_data(title)
             )
         ])
 
     nav_buttons = []
 
-    if offset > 0:
+    if offset > 0 and current_page:
         nav_buttons.append(
-            InlineKeyboardButton("◀ Back", callback_data=safe_callback_data("back", str(offset - MOVIES_PER_PAGE)))
+            InlineKeyboardButton("◀ Back", callback_data=browse_callback(mode, "b", current_page[0]))
         )
 
-    if end < len(movies):
+    if mode == "az":
+        nav_buttons.append(InlineKeyboardButton("🔤 Jump", callback_data="mj"))
+
+    if end < len(entries):
         nav_buttons.append(
-            InlineKeyboardButton("▶ Show More", callback_data=safe_callback_data("more", str(end)))
+            InlineKeyboardButton("▶ Show More", callback_data=browse_callback(mode, "f", entries[end]))
         )
 
     if nav_buttons:
         keyboard.append(nav_buttons)
 
-    msg = await send_func(
-        f"🎬 Showing movies {offset + 1} to {min(end, len(movies))} of {len(movies)}",
-        reply_markup=InlineKeyboardMarkup(keyboard)
-    )
+    if not current_page:
+        text = f"🎬 {view.label}: nothing here yet."
+    else:
+        text = f"🎬 {view.label}: showing {offset + 1} to {min(end, len(entries))} of {len(entries)}"
+        if mode == "year":
+            text += f" ({-current_page[0][0]}–{-current_page[-1][0]})"
+
+    msg = await send_func(text, reply_markup=InlineKeyboardMarkup(keyboard))
 
     user_last_bot_message[user_id] = msg.message_id
 
 
+def letter_jump_keyboard() -> InlineKeyboardMarkup:
+    buttons = [
+        InlineKeyboardButton(letter, callback_data=browse_callback("az", "f", ("" if letter == "#" else letter.casefold(), "")))
+        for letter in JUMP_LETTERS
+    ]
+    return InlineKeyboardMarkup([buttons[i:i + 7] for i in range(0, len(buttons), 7)])
+
+
 
 async def show_movie(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
@@ -1361,17 +4693,10 @@ async def show_movie(update: Update, context: ContextTypes.DEFAULT_TYPE):
         movie = movies[safe]
         real_title = safe
 
-    # 2) match by cleaning Firebase titles the SAME way
+    # 2) match by cleaning Firebase titles the SAME way (indexed)
     if not movie:
-        for title, data in movies.items():
-            cleaned = clean_firebase_key(title)
-            cleaned = re.sub(r"[^a-zA-Z0-9_\-]", "", cleaned)
-            cleaned = cleaned[:50]
-
-            if cleaned == safe:
-                movie = data
-                real_title = title
-                break
+        real_title = get_callback_index().get(safe)
+        movie = movies.get(real_title) if real_title else None
 
     # 3) still not found
     if not movie:
@@ -1379,10 +4704,12 @@ async def show_movie(update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_last_bot_message[query.from_user.id] = msg.message_id
         return
 
-    # Fetch poster if missing
-    await ensure_poster_for_movie(real_title, force=False)
-
     meta = movie.get("meta", {})
+
+    # Reply with what we have; missing or stale metadata is fetched in the background
+    if needs_enrichment(meta):
+        enrichment_queue.submit(real_title)
+
     poster = meta.get("poster")
     year = meta.get("year")
 
@@ -1580,22 +4907,47 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     if query.data.startswith("delete|"):
         _, title = query.data.split("|", 1)
-        ref.child(title).delete()
+        storage.delete_movie(title)
         await query.edit_message_text(f"\u2705 Movie *{title.replace('_',' ')}* deleted.", parse_mode="Markdown")
 
     elif query.data.startswith("movie|"):
         await show_movie(update, context)
 
+    elif query.data.startswith("sp|"):
+        await show_search_page(update, context)
+
+    elif query.data.startswith("rq|"):
+        await show_requests_page(update, context)
+
     elif query.data.startswith("report|"):
         _, title = query.data.split("|", 1)
+        title = resolve_report_title(title)
 
-        if user_id in user_reported_movies and title in user_reported_movies[user_id]:
-            await query.edit_message_text("⚠️ You've already reported this movie.")
+        report = storage.get_report(report_key(title)) or {}
+        if str(user_id) in (report.get("users") or {}):
+            await query.message.reply_text("⚠️ You've already reported this movie.")
             return
 
-        pending_reports[user_id] = title
+        pending_reports[user_id] = {"title": title, "quality": None}
+        qualities = [q for q, v in (get_movies().get(title) or {}).items() if q != "meta" and isinstance(v, str)]
+        keyboard = [[InlineKeyboardButton(f"❌ {q}", callback_data=safe_callback_data("rpq", q))] for q in qualities]
+        keyboard.append([InlineKeyboardButton("❌ All links", callback_data="rpq|all")])
+        await query.message.reply_text(
+            f"⚠️ Which link is broken for *{title.replace('_', ' ')}*?",
+            parse_mode="Markdown",
+            reply_markup=InlineKeyboardMarkup(keyboard)
+        )
+
+    elif query.data.startswith("rpq|"):
+        _, quality = query.data.split("|", 1)
+        if user_id not in pending_reports:
+            return await query.edit_message_text("⌛ Report expired. Please tap Report again.")
+
+        pending = pending_reports[user_id]
+        pending_reports[user_id] = {**pending, "quality": quality}
+        title = pending["title"]
         await query.edit_message_text(
-            f"📝 Please describe the problem with *{title.replace('_', ' ')}*.\n\n"
+            f"📝 Please describe the problem with *{title.replace('_', ' ')}* ({quality}).\n\n"
             f"Example: 'Wrong link', '404 not found', 'GDToT page blank', etc.",
             parse_mode="Markdown"
        )
@@ -1629,42 +4981,47 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     elif query.data == "missing_next":
         uid = query.from_user.id
-        missing_posters_offset[uid] += POSTERS_PER_PAGE
+        missing_posters_offset[uid] = missing_posters_offset.get(uid, 0) + POSTERS_PER_PAGE
         await query.message.delete()
         await show_missing_page(update, context)
 
     elif query.data == "missing_prev":
         uid = query.from_user.id
-        missing_posters_offset[uid] = max(0, missing_posters_offset[uid] - POSTERS_PER_PAGE)
+        missing_posters_offset[uid] = max(0, missing_posters_offset.get(uid, 0) - POSTERS_PER_PAGE)
         await query.message.delete()
         await show_missing_page(update, context)
 
     elif query.data == "year_next":
         uid = query.from_user.id
-        missing_year_offset[uid] += MISSING_YEAR_PER_PAGE
+        missing_year_offset[uid] = missing_year_offset.get(uid, 0) + MISSING_YEAR_PER_PAGE
         await query.message.delete()
         await show_missing_year_page(update.callback_query, context)
 
     elif query.data == "year_prev":
         uid = query.from_user.id
-        missing_year_offset[uid] = max(0, missing_year_offset[uid] - MISSING_YEAR_PER_PAGE)
+        missing_year_offset[uid] = max(0, missing_year_offset.get(uid, 0) - MISSING_YEAR_PER_PAGE)
         await query.message.delete()
         await show_missing_year_page(update.callback_query, context)
     
-    elif query.data.startswith("more|"):
-        _, new_offset = query.data.split("|", 1)
-        user_movie_offset[user_id] = int(new_offset)
+    elif query.data.startswith("mv|"):
+        mode, backwards, cursor = parse_browse_callback(query.data)
         await delete_last(user_id, context)
-        await show_movie_page(user_id, context, query.message.reply_text)
+        await show_movie_page(user_id, context, query.message.reply_text, mode, cursor, backwards)
 
-    elif query.data.startswith("back|"):
-        _, new_offset = query.data.split("|", 1)
-        user_movie_offset[user_id] = max(0, int(new_offset))
+    elif query.data == "mj":
+        await query.edit_message_reply_markup(reply_markup=letter_jump_keyboard())
+
+    elif query.data.startswith(("more|", "back|")):
+        # buttons sent before browse views existed carry a raw key
+        direction, cursor = query.data.split("|", 1)
         await delete_last(user_id, context)
-        await show_movie_page(user_id, context, query.message.reply_text)
+        await show_movie_page(
+            user_id, context, query.message.reply_text, "az", (cursor.casefold(), cursor_hash(cursor)),
+            direction == "back"
+        )
    
     elif query.data == "confirm_delete_all":
-        ref.set({})  # Clears the 'movies' node
+        storage.clear_movies()  # Clears the 'movies' node
         await query.edit_message_text("✅ All movies have been deleted from the database.")
 
     elif query.data.startswith("edit_title_select|"):
@@ -1688,36 +5045,131 @@ async def admin_panel(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 /addmovie Title Quality Link
 /uploadbulk
+/uploadstatus
+/uploadcancel JobId
 /removemovie Title
+/renamebulk
+/posterbulk
+/reports
+/checklinks
+/profile Seconds
+/perfstats
 /admin
 """
     await update.message.reply_text(commands, parse_mode="Markdown")
 
-telegram_app.add_handler(CommandHandler("start", start))
-telegram_app.add_handler(CommandHandler("addmovie", add_movie))
-telegram_app.add_handler(CommandHandler("uploadbulk", upload_bulk))
-telegram_app.add_handler(CommandHandler("requestmovie", request_movie))
-telegram_app.add_handler(CommandHandler("request", view_requests))
-telegram_app.add_handler(CommandHandler("getpdf", getpdf))
-telegram_app.add_handler(CommandHandler("getpdfrecent", getpdfrecent))
-telegram_app.add_handler(CommandHandler("search", search_movie))  # Still works for /search
-telegram_app.add_handler(CommandHandler("removemovie", remove_movie))
-telegram_app.add_handler(CommandHandler("scanposters", scan_posters))
-telegram_app.add_handler(CommandHandler("missingyear", list_missing_year))
-telegram_app.add_handler(CommandHandler("missingposters", missing_posters))
-telegram_app.add_handler(CommandHandler("fixposter", fixposter_command))
-telegram_app.add_handler(CommandHandler("admin", admin_panel))
-telegram_app.add_handler(CommandHandler("movies", list_movies))
-telegram_app.add_handler(CommandHandler("edittitle", edittitle_command))
-telegram_app.add_handler(CommandHandler("cleantitles", clean_titles))
-telegram_app.add_handler(CommandHandler("removeall", remove_all_movies))
-telegram_app.add_handler(CommandHandler("stats", show_user_stats))
-telegram_app.add_handler(CommandHandler("broadcast", broadcast))
-telegram_app.add_handler(MessageHandler(filters.Document.ALL, upload_bulk))
-telegram_app.add_handler(CallbackQueryHandler(button_handler))
+
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Admin only: /profile <seconds> — cProfile live traffic and send the hotspots."""
+    global active_profiler
+
+    if update.effective_user.id != ADMIN_ID:
+        return await update.message.reply_text("⛔ Not authorized.")
+
+    try:
+        seconds = int(context.args[0]) if context.args else 30
+    except ValueError:
+        return await update.message.reply_text("Usage:\n/profile Seconds")
+    seconds = max(1, min(seconds, PROFILE_MAX_SECONDS))
+
+    if active_profiler is not None:
+        return await update.message.reply_text("⚠️ A profile is already running.")
+
+    active_profiler = cProfile.Profile()
+    await update.message.reply_text(f"🧪 Profiling live traffic for {seconds}s…")
+    spawn(run_profile(context, update.effective_chat.id, seconds, active_profiler))
+
+
+async def perf_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Admin only: cache and catalog statistics."""
+    if update.effective_user.id != ADMIN_ID:
+        return await update.message.reply_text("⛔ Not authorized.")
+
+    age = int(time.time() - catalog.loaded_at) if catalog.data is not None else None
+    lines = [
+        "📊 Performance stats",
+        "",
+        f"🎬 Catalog: {len(catalog.data or {})} titles, version {catalog.version}"
+        + (f", loaded {age}s ago" if age is not None else ", not loaded")
+        + (", snapshot current" if catalog.snapshot_version == catalog.version else ""),
+        f"🔄 Catalog sync: {catalog.stats()}",
+        f"🧵 Worker: {WORKER_ID} of {WORKERS}" + (", leader" if is_leader() else ""),
+        f"🔍 Search cache: {search_cache.stats()}",
+        f"⌨️ Inline cache: {inline_cache.stats()}",
+        f"🚦 Rate limiter: {rate_limiter.stats()}",
+        f"📤 Outbox: {outbox.stats()}",
+        f"🗑 Deletions: {deletions.stats()}",
+        f"🖼 Enrichment: {enrichment_queue.stats()}",
+        f"⚠️ Reports: {storage.count_docs('Reports')} titles, digest every {REPORT_DIGEST_MINUTES}m",
+        f"🔗 Link check: {link_check_status()}",
+        f"📦 Uploads: {len(pending_upload_jobs())} queued or running",
+        f"📝 Logs: {hot_log.stats()}",
+    ]
+    await update.message.reply_text("\n".join(lines))
+
+
+async def run_profile(context, chat_id, seconds, profiler):
+    """Collect a profile for `seconds` and send the top hotspots as a document."""
+    global active_profiler
+
+    profiler.enable()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        profiler.disable()
+        active_profiler = None
+
+    report = StringIO()
+    stats = pstats.Stats(profiler, stream=report)
+    report.write(f"Profile of live traffic over {seconds}s\n\n=== By cumulative time ===\n")
+    stats.sort_stats("cumulative").print_stats(40)
+    report.write("\n=== By internal time ===\n")
+    stats.sort_stats("tottime").print_stats(40)
+
+    try:
+        await context.bot.send_document(
+            chat_id=chat_id,
+            document=BytesIO(report.getvalue().encode("utf-8")),
+            filename=f"profile_{int(time.time())}.txt",
+            caption=f"🧪 Top hotspots over {seconds}s"
+        )
+    except Exception as e:
+        logging.warning(f"Failed to send profile: {e}")
+
+add_timed_handler(CommandHandler("start", start))
+add_timed_handler(CommandHandler("addmovie", add_movie))
+add_timed_handler(CommandHandler("uploadbulk", upload_bulk))
+add_timed_handler(CommandHandler("uploadstatus", upload_status))
+add_timed_handler(CommandHandler("uploadcancel", upload_cancel))
+add_timed_handler(CommandHandler("requestmovie", request_movie))
+add_timed_handler(CommandHandler("request", view_requests))
+add_timed_handler(CommandHandler("getpdf", getpdf))
+add_timed_handler(CommandHandler("getpdfrecent", getpdfrecent))
+add_timed_handler(CommandHandler("search", search_movie))  # Still works for /search
+add_timed_handler(CommandHandler("removemovie", remove_movie))
+add_timed_handler(CommandHandler("scanposters", scan_posters))
+add_timed_handler(CommandHandler("missingyear", list_missing_year))
+add_timed_handler(CommandHandler("missingposters", missing_posters))
+add_timed_handler(CommandHandler("fixposter", fixposter_command))
+add_timed_handler(CommandHandler("admin", admin_panel))
+add_timed_handler(CommandHandler("movies", list_movies))
+add_timed_handler(CommandHandler("edittitle", edittitle_command))
+add_timed_handler(CommandHandler("cleantitles", clean_titles))
+add_timed_handler(CommandHandler("removeall", remove_all_movies))
+add_timed_handler(CommandHandler("stats", show_user_stats))
+add_timed_handler(CommandHandler("broadcast", broadcast))
+add_timed_handler(CommandHandler("profile", profile_command))
+add_timed_handler(CommandHandler("perfstats", perf_stats))
+add_timed_handler(CommandHandler("reports", view_reports))
+add_timed_handler(CommandHandler("checklinks", check_links))
+add_timed_handler(CommandHandler("renamebulk", rename_bulk))
+add_timed_handler(CommandHandler("posterbulk", poster_bulk))
+add_timed_handler(MessageHandler(filters.Document.ALL, handle_document))
+add_timed_handler(CallbackQueryHandler(button_handler))
+add_timed_handler(InlineQueryHandler(inline_search))
 
 # ✅ Handles both title edit and general text search
-telegram_app.add_handler(MessageHandler(filters.TEXT & filters.ChatType.PRIVATE, handle_title_or_search))
+add_timed_handler(MessageHandler(filters.TEXT & filters.ChatType.PRIVATE, handle_title_or_search))
 
 
 
@@ -1728,7 +5180,37 @@ async def on_startup():
     webhook_url = os.getenv("WEBHOOK_URL")
     if not webhook_url:
         raise ValueError("WEBHOOK_URL is not set.")
-    await telegram_app.bot.set_webhook(webhook_url)
+    slot = claim_worker_slot()
+    leader = hold_lease(LEADER_LEASE)
+    logging.info(f"Worker {WORKER_ID} started in slot {slot}" + (" as leader" if leader else ""))
+    if leader:
+        await telegram_app.bot.set_webhook(webhook_url)
+    deletions.doc = DeletionScheduler.slot_doc(slot)
+    deletions.restore(telegram_app.bot)
+    if leader:
+        adopt_orphaned_deletions(persisted_deletion_slots())
+    catalog.get()  # warm start from the snapshot before the first user needs it
+    spawn(lease_loop())
+    spawn(catalog_watch_loop())
+    spawn(snapshot_loop())
+    spawn(report_digest_loop())
+    if leader:
+        spawn(resume_link_check())
+        spawn(resume_uploads())
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    deletions.flush()
+    if is_leader():  # like snapshot_loop: one writer per host
+        try:
+            await catalog.save_snapshot()
+        except Exception as e:
+            logging.warning(f"Catalog snapshot on shutdown failed: {e}")
+    if http_client is not None:
+        await http_client.aclose()
+    for name in list(held_leases):  # let a restarted worker reclaim its slot, and another lead at once
+        drop_lease(name)
+    stop_logging()
 
 @app.post("/webhook")
 async def telegram_webhook(request: Request):
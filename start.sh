@@ -1,5 +1,4 @@
 #!/bin/bash
 PORT=${PORT:-8000}
-exec uvicorn main:app --host 0.0.0.0 --port $PORT
-
-
+# workers share conversation state, job locks and the catalog version through STATE_PATH
+exec uvicorn main:app --host 0.0.0.0 --port $PORT --workers ${WEB_CONCURRENCY:-1}